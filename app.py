@@ -1,192 +1,833 @@
 import os
+import re
 import json
 import requests
 import datetime
-import re
-from flask import Flask, render_template, request, jsonify, redirect, send_file, url_for, session
+import copy
+import time
+import random
+import hashlib
+import sqlite3
+import threading
+import asyncio
+import uuid
+import logging
+import mimetypes
+from urllib.parse import quote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from storage import JSONUserStore, SQLiteUserStore, UserDataTooLarge, migrate_json_to_sqlite, skill_key
+from json_repair import recover_json, JSONRecoveryError
+from prompts import get_prompt
+from static_assets import StaticAssets
+import metrics
+try:
+    import aiohttp
+except ImportError:  # aiohttp is only needed for the async generation endpoints
+    aiohttp = None
+from flask.sessions import SecureCookieSessionInterface
+from flask import Flask, Response, make_response, render_template, request, jsonify, redirect, send_from_directory, url_for, session, stream_with_context, g
 
-# Gemini API Client
-class GeminiClient:
+logger = logging.getLogger(__name__)
+
+GEMINI_SECONDS = metrics.histogram(
+    "gemini_request_seconds", "Latency of Gemini calls that missed the response cache, including retries", ["task", "outcome"])
+GEMINI_TOKENS = metrics.counter(
+    "gemini_tokens_total", "Tokens reported in Gemini usageMetadata", ["task", "kind"])
+GEMINI_TRUNCATIONS = metrics.counter(
+    "gemini_truncated_responses_total", "Gemini replies cut off by the maxOutputTokens limit", ["task"])
+GEMINI_JSON_RECOVERY = metrics.counter(
+    "gemini_json_recovery_total", "Gemini replies that needed JSON repair, by whether it succeeded", ["task", "result"])
+HTTP_SECONDS = metrics.histogram(
+    "http_request_seconds", "Time to handle a request, up to the first byte for streamed responses", ["endpoint", "method", "status"])
+
+# Response cache for Gemini calls
+class MemoryCacheBackend:
+    """In-process cache backend, kept in least-recently-used order"""
     def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY", "YOUR_API_KEY")
-        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        self._entries = OrderedDict()
 
-    def send_prompt(self, prompt, model="gemini-2.0-flash", max_tokens=2500, temperature=0.7):
-        try:
-            url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
-            # Enhanced system prompt with stronger JSON formatting instructions and size restriction
-            system_prompt = """You are an educational AI assistant.
-            IMPORTANT: Your ENTIRE response must be ONLY a valid JSON object.
-            DO NOT include explanations, markdown formatting, code blocks, or any text outside the JSON.
-            Keep your response concise to avoid truncation. Limit to 8-10 steps maximum.
-            Respond with ONLY this JSON structure:
-
-            {
-                "skill_name": "Skill Name",
-                "description": "Brief description",
-                "steps": [
-                    {
-                        "title": "Step title",
-                        "explanation": "Short explanation (1-2 sentences)",
-                        "exercise": "Brief exercise",
-                        "tip": "Short tip",
-                        "sub_steps": [
-                            {
-                                "title": "Sub-step title",
-                                "explanation": "Short sub-step explanation",
-                                "exercise": "Brief sub-step exercise",
-                                "tip": "Short sub-step tip"
-                            }
-                        ]
-                    }
-                ]
-            }"""
-            payload = {
-                "contents": [
-                    {
-                        "role": "user",
-                        "parts": [{"text": f"{system_prompt}\n\nTopic: {prompt}"}]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": temperature,
-                    "maxOutputTokens": max_tokens,
-                    "topP": 0.8,
-                    "topK": 40
-                }
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, value, stored_at):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def evict(self, max_entries):
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache backend so cached plans survive restarts and are shared between workers"""
+    # LRU order only needs to be roughly right, so hits refresh last_access at most this often (seconds)
+    ACCESS_RESOLUTION = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        row = self._conn.execute(
+            "SELECT stored_at, value, last_access FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # Skipping the write on most hits keeps lookups read-only and off the disk
+        now = time.time()
+        if now - row[2] >= self.ACCESS_RESOLUTION:
+            self._conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def set(self, key, value, stored_at):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, stored_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), stored_at, time.time())
+        )
+        self._conn.commit()
+
+    def delete(self, key):
+        self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def evict(self, max_entries):
+        self._conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            "SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Content-addressed cache for parsed Gemini responses with TTL and size-bounded LRU eviction"""
+    def __init__(self, backend=None, ttl=24 * 60 * 60, max_entries=1000):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, model, temperature, max_tokens, task="plan"):
+        # Normalize the topic so "Python", " python " and "PYTHON" share one entry
+        normalized = " ".join(str(prompt).lower().split())
+        material = json.dumps([task, normalized, model, temperature, max_tokens])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl is None or time.time() - stored_at < self.ttl:
+                    self.hits += 1
+                    # Hand out a copy so callers can decorate the plan without touching the cache
+                    return copy.deepcopy(value)
+                self.backend.delete(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self.backend.set(key, copy.deepcopy(value), time.time())
+            self.backend.evict(self.max_entries)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.backend)
             }
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            print("Raw API Response:", response.text) # Debug logging
-            response_data = response.json()
-            if "candidates" not in response_data or not response_data["candidates"]:
-                return {"error": "No valid response generated"}
-            
-            # Check if the response was truncated
-            finish_reason = response_data["candidates"][0].get("finishReason", "")
-            if finish_reason == "MAX_TOKENS":
-                print("WARNING: Response was truncated due to MAX_TOKENS limit")
-            
-            # Extract the text response
-            text_response = response_data["candidates"][0]["content"]["parts"][0]["text"]
-            print("Text Response:", text_response) # Additional debug logging
-            
-            # Improved JSON parsing with better error handling
+
+
+def create_response_cache():
+    """Build the response cache configured by the RESPONSE_CACHE_* environment variables"""
+    backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    if backend_name == "none":
+        return None
+    if backend_name == "sqlite":
+        cache_path = os.getenv(
+            "RESPONSE_CACHE_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.db")
+        )
+        backend = SQLiteCacheBackend(cache_path)
+    else:
+        backend = MemoryCacheBackend()
+    return ResponseCache(
+        backend,
+        ttl=int(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60)),
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1000))
+    )
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call whose result is shared"""
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+
+    def wait(self, key, timeout=None):
+        """Block until an in-flight call for `key` finishes; returns False if none was running"""
+        with self._lock:
+            call = self._calls.get(key)
+        if call is None:
+            return False
+        return call["done"].wait(timeout)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when the circuit breaker is open and upstream calls are being short-circuited"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive upstream failures and lets a single trial call through after a cooldown"""
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let one trial request through and re-arm the timer for the rest
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def backoff_delay(attempt, base, cap, retry_after=None):
+    """Seconds to wait before retry number `attempt`, honouring a Retry-After header when present"""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    # Full jitter keeps retrying workers from stampeding the API in lockstep
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class GeminiTransport:
+    """Pooled keep-alive HTTP transport with timeouts, jittered exponential backoff and a circuit breaker"""
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, pool_size=10, connect_timeout=5, read_timeout=60, max_retries=3,
+                 backoff_base=0.5, backoff_max=8, circuit_breaker=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_size=int(os.getenv("GEMINI_POOL_SIZE", 10)),
+            connect_timeout=float(os.getenv("GEMINI_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(os.getenv("GEMINI_READ_TIMEOUT", 60)),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3))
+        )
+
+    def _backoff(self, attempt, retry_after=None):
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after)
+
+    def post(self, url, payload, stream=False):
+        """POST a JSON payload, retrying on 429/5xx and connection errors; returns the final response"""
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError("Gemini API circuit is open after repeated failures")
+        attempt = 0
+        while True:
             try:
-                # More robust cleaning of the response
-                cleaned_response = text_response.strip()
-                # Remove any code block markers or markdown formatting
-                if cleaned_response.startswith("```"):
-                    cleaned_response = cleaned_response[3:]
-                elif cleaned_response.startswith("```"):
-                    cleaned_response = cleaned_response[3:]
-                if cleaned_response.endswith("```"):
-                    cleaned_response = cleaned_response[:-3]
-                cleaned_response = cleaned_response.strip()
-                
-                # If the response is empty after cleaning, return an error
-                if not cleaned_response:
-                    return {"error": "Empty response after cleaning", "raw_response": text_response}
-                
-                # Try to fix truncated JSON by adding missing closing brackets if needed
-                if finish_reason == "MAX_TOKENS":
+                response = self.session.post(url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            if response.status_code in self.RETRY_STATUSES:
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    return response
+                retry_after = response.headers.get("Retry-After")
+                # Return the connection to the pool now; a streamed body would otherwise hold it until GC
+                response.close()
+                time.sleep(self._backoff(attempt, retry_after))
+                attempt += 1
+                continue
+            self.circuit_breaker.record_success()
+            return response
+
+
+class IncrementalPlanParser:
+    """Scans streamed plan JSON once, string-aware, and emits each step object as soon as it closes"""
+    def __init__(self):
+        self.buffer = ""
+        self.header = None
+        self.steps = []
+        self._pos = 0
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._steps_depth = None
+        self._step_start = None
+
+    def feed(self, chunk):
+        """Consume the next chunk of text; returns the ("plan" | "step", payload) events it completed"""
+        self.buffer += chunk
+        events = []
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            pos = self._pos
+            ch = buffer[pos]
+            self._pos += 1
+            if self._start is None:
+                # Skip anything before the outermost object, such as a ```json fence
+                if ch == "{":
+                    self._start = pos
+                    self._stack.append(ch)
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start + 1:pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == ":" and len(self._stack) == 1:
+                self._key = self._last_string
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1 and self._key == "steps" and self._steps_depth is None:
+                    self._steps_depth = 2
+                    events.extend(self._emit_header(buffer[self._start:pos]))
+                elif ch == "{" and len(self._stack) == self._steps_depth:
+                    self._step_start = pos
+                self._stack.append(ch)
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and len(self._stack) == self._steps_depth and self._step_start is not None:
                     try:
-                        # Attempt to parse as is first
-                        json.loads(cleaned_response)
-                    except json.JSONDecodeError as e:
-                        # If it fails, try to repair the JSON
-                        cleaned_response = self._repair_truncated_json(cleaned_response)
-                
-                # Parse the JSON
-                return json.loads(cleaned_response)
-            except json.JSONDecodeError as e:
-                print(f"JSON Parse Error: {str(e)}")
-                print("Cleaned Response:", cleaned_response)
-                # Try to extract JSON from the response if it contains mixed content
-                try:
-                    # Look for JSON object pattern
-                    json_pattern = r'(\{.*\})'
-                    match = re.search(json_pattern, text_response, re.DOTALL)
-                    if match:
-                        potential_json = match.group(1)
-                        return json.loads(potential_json)
-                except:
-                    pass
-                return {
-                    "error": f"JSON parsing failed: {str(e)}",
-                    "raw_response": text_response
+                        # strict=False: raw newlines inside strings are accepted, as recover_json does
+                        step = json.loads(buffer[self._step_start:pos + 1], strict=False)
+                    except json.JSONDecodeError:
+                        step = None
+                    if isinstance(step, dict):
+                        self.steps.append(step)
+                        events.append(("step", step))
+                    self._step_start = None
+        return events
+
+    def _emit_header(self, prefix):
+        # prefix ends with `"steps":`, so closing it with an empty array gives the plan's other fields
+        try:
+            header = json.loads(prefix + "[]}", strict=False)
+        except json.JSONDecodeError:
+            return []
+        header.pop("steps", None)
+        self.header = header
+        return [("plan", header)]
+
+
+# Gemini API Client
+class BaseGeminiClient:
+    """Request building, response parsing and telemetry shared by the sync and async clients"""
+    def __init__(self, cache=None):
+        self.api_key = os.getenv("GEMINI_API_KEY", "YOUR_API_KEY")
+        self.base_url = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
+        self.cache = cache
+
+    def _build_payload(self, prompt, max_tokens, temperature, task="plan"):
+        template = get_prompt(task)
+        payload = {
+            "systemInstruction": {
+                "parts": [{"text": template.system}]
+            },
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{"text": template.render(prompt)}]
                 }
+            ],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_tokens,
+                "topP": 0.8,
+                "topK": 40,
+                **template.generation_config()
+            }
+        }
+        return payload
+
+    def _observe(self, task, started, result):
+        outcome = "error" if not isinstance(result, dict) or "error" in result else "ok"
+        GEMINI_SECONDS.observe(time.perf_counter() - started, task=task, outcome=outcome)
+
+    @staticmethod
+    def _record_usage(task, usage):
+        for field, kind in (("promptTokenCount", "prompt"), ("candidatesTokenCount", "completion"), ("totalTokenCount", "total")):
+            if usage.get(field):
+                GEMINI_TOKENS.inc(usage[field], task=task, kind=kind)
+
+    def _parse_response(self, response_data, task="plan"):
+        """Turn a generateContent response body into the parsed JSON object or an error dict"""
+        self._record_usage(task, response_data.get("usageMetadata") or {})
+        if "candidates" not in response_data or not response_data["candidates"]:
+            return {"error": "No valid response generated"}
+        
+        finish_reason = response_data["candidates"][0].get("finishReason", "")
+        
+        # Extract the text response
+        text_response = response_data["candidates"][0]["content"]["parts"][0]["text"]
+        logger.debug("Text response: %s", text_response)
+        return self._parse_text(text_response, finish_reason, task)
+
+    def _parse_text(self, text_response, finish_reason="", task="plan"):
+        """Parse the model's text into a JSON object, repairing truncated output"""
+        if finish_reason == "MAX_TOKENS":
+            GEMINI_TRUNCATIONS.inc(task=task)
+            logger.warning("Gemini %s response was truncated by the MAX_TOKENS limit", task)
+        try:
+            result, repaired = recover_json(text_response)
+        except JSONRecoveryError as e:
+            GEMINI_JSON_RECOVERY.inc(task=task, result="failed")
+            logger.warning("JSON parse error in %s response: %s", task, e)
+            return {
+                "error": f"JSON parsing failed: {str(e)}",
+                "raw_response": text_response
+            }
+        if repaired:
+            GEMINI_JSON_RECOVERY.inc(task=task, result="repaired")
+            logger.info("Repaired truncated JSON in %s response (finish reason: %s)", task, finish_reason or "unknown")
+        return result
+
+
+class GeminiClient(BaseGeminiClient):
+    def __init__(self, cache=None, transport=None):
+        super().__init__(cache)
+        self.transport = transport if transport is not None else GeminiTransport.from_env()
+        self._flight = SingleFlight()
+
+    def send_prompt(self, prompt, model="gemini-2.0-flash", max_tokens=2500, temperature=0.7, task="plan"):
+        """Send `prompt` using the system instructions and response schema registered for `task` in prompts.py"""
+        cache_key = ResponseCache.make_key(prompt, model, temperature, max_tokens, task)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        # Concurrent callers for the same prompt wait on a single upstream request
+        result = self._flight.do(cache_key, lambda: self._fetch_and_cache(cache_key, prompt, model, max_tokens, temperature, task))
+        # Every caller gets its own copy since routes decorate the plan in place
+        return copy.deepcopy(result)
+
+    def _fetch_and_cache(self, cache_key, prompt, model, max_tokens, temperature, task):
+        started = time.perf_counter()
+        result = self._send_prompt_uncached(prompt, model, max_tokens, temperature, task)
+        self._observe(task, started, result)
+        # Only successful responses are cached; errors should be retried next time
+        if self.cache is not None and isinstance(result, dict) and "error" not in result:
+            self.cache.set(cache_key, result)
+        return result
+
+    def _send_prompt_uncached(self, prompt, model, max_tokens, temperature, task="plan"):
+        try:
+            url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
+            payload = self._build_payload(prompt, max_tokens, temperature, task)
+            response = self.transport.post(url, payload)
+            response.raise_for_status()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Raw API response: %s", response.text)
+            return self._parse_response(response.json(), task)
         except requests.exceptions.RequestException as e:
             return {"error": f"API Error: {str(e)}"}
         except Exception as e:
             return {"error": f"Unexpected Error: {str(e)}"}
 
-    def _repair_truncated_json(self, json_str):
-        """Attempt to repair a truncated JSON string by balancing brackets"""
-        # Count opening and closing brackets, braces, and quotes
-        open_braces = json_str.count('{')
-        close_braces = json_str.count('}')
-        open_brackets = json_str.count('[')
-        close_brackets = json_str.count(']')
+    def stream_plan(self, prompt, model="gemini-2.0-flash", max_tokens=2500, temperature=0.7):
+        """Generate a plan with streamGenerateContent, yielding (event, payload) pairs as it arrives:
+        ("plan", header without steps), ("step", step) for each step as soon as it closes,
+        then ("done", full plan) or ("error", {"error": ...})"""
+        cache_key = ResponseCache.make_key(prompt, model, temperature, max_tokens, "plan")
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        if cached is not None:
+            yield "plan", {k: v for k, v in cached.items() if k != "steps"}
+            for step in cached.get("steps", []):
+                yield "step", step
+            yield "done", cached
+            return
+        
+        parser = IncrementalPlanParser()
+        chunks = []
+        finish_reason = ""
+        started = time.perf_counter()
+        try:
+            for text, chunk_finish_reason in self._stream_text(prompt, model, max_tokens, temperature):
+                chunks.append(text)
+                finish_reason = chunk_finish_reason or finish_reason
+                yield from parser.feed(text)
+        except requests.exceptions.RequestException as e:
+            self._observe("plan_stream", started, None)
+            yield "error", {"error": f"API Error: {str(e)}"}
+            return
+        except ValueError as e:
+            self._observe("plan_stream", started, None)
+            yield "error", {"error": f"Unexpected Error: {str(e)}"}
+            return
         
-        # If we have unbalanced quotes, find the last complete object
-        if open_braces > close_braces or open_brackets > close_brackets:
-            print(f"Attempting to repair truncated JSON. Imbalance detected: {open_braces}:{close_braces} braces, {open_brackets}:{close_brackets} brackets")
-            # Find the last complete object by working backwards
-            # First, ensure we have a valid starting structure
-            if not json_str.strip().startswith('{'):
-                return json_str # Can't repair if it doesn't start properly
-            
-            # Try to find the last valid position
-            repaired = json_str
-            # Add missing closing brackets and braces
-            for _ in range(open_brackets - close_brackets):
-                repaired += "]"
-            for _ in range(open_braces - close_braces):
-                repaired += "}"
-            return repaired
-        return json_str # Return original if it seems balanced
+        plan = self._parse_text("".join(chunks), finish_reason, "plan_stream")
+        self._observe("plan_stream", started, plan)
+        if "error" in plan:
+            # Keep whatever complete steps made it through before the stream broke off
+            if not parser.steps:
+                yield "error", plan
+                return
+            plan = dict(parser.header or {}, steps=parser.steps)
+        elif self.cache is not None:
+            self.cache.set(cache_key, plan)
+        yield "done", plan
+
+    def _stream_text(self, prompt, model, max_tokens, temperature):
+        """Yield (text, finish_reason) for each server-sent event of a streamGenerateContent call"""
+        url = f"{self.base_url}/{model}:streamGenerateContent?alt=sse&key={self.api_key}"
+        response = self.transport.post(url, self._build_payload(prompt, max_tokens, temperature, "plan"), stream=True)
+        usage = {}
+        with response:
+            response.raise_for_status()
+            # SSE is always UTF-8; without a charset requests would decode it as ISO-8859-1
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):])
+                # Each chunk reports the running totals, so only the last one is recorded
+                usage = chunk.get("usageMetadata") or usage
+                candidates = chunk.get("candidates") or [{}]
+                parts = candidates[0].get("content", {}).get("parts", [])
+                yield "".join(part.get("text", "") for part in parts), candidates[0].get("finishReason")
+        self._record_usage("plan_stream", usage)
+
+class AsyncGeminiClient(BaseGeminiClient):
+    """asyncio counterpart of GeminiClient: `await send_prompt(...)` returns the same dict contract"""
+    def __init__(self, cache=None, max_concurrency=200, connect_timeout=5, read_timeout=60,
+                 max_retries=3, backoff_base=0.5, backoff_max=8, circuit_breaker=None):
+        if aiohttp is None:
+            raise RuntimeError("AsyncGeminiClient requires the aiohttp package")
+        super().__init__(cache)
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        # Created lazily because they must belong to the loop that runs the requests
+        self._session = None
+        self._semaphore = None
+        self._in_flight = {}
+
+    @classmethod
+    def from_env(cls, cache=None):
+        return cls(
+            cache=cache,
+            max_concurrency=int(os.getenv("GEMINI_ASYNC_CONCURRENCY", 200)),
+            connect_timeout=float(os.getenv("GEMINI_CONNECT_TIMEOUT", 5)),
+            read_timeout=float(os.getenv("GEMINI_READ_TIMEOUT", 60)),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 3))
+        )
+
+    async def send_prompt(self, prompt, model="gemini-2.0-flash", max_tokens=2500, temperature=0.7, task="plan"):
+        cache_key = ResponseCache.make_key(prompt, model, temperature, max_tokens, task)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        # Same single-flight behaviour as the sync client, using a shared task instead of a lock
+        future = self._in_flight.get(cache_key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_cache(cache_key, prompt, model, max_tokens, temperature, task))
+            self._in_flight[cache_key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(cache_key, None))
+        result = await asyncio.shield(future)
+        return copy.deepcopy(result)
+
+    async def _fetch_and_cache(self, cache_key, prompt, model, max_tokens, temperature, task):
+        started = time.perf_counter()
+        result = await self._send_prompt_uncached(prompt, model, max_tokens, temperature, task)
+        self._observe(task, started, result)
+        if self.cache is not None and isinstance(result, dict) and "error" not in result:
+            self.cache.set(cache_key, result)
+        return result
+
+    async def _send_prompt_uncached(self, prompt, model, max_tokens, temperature, task="plan"):
+        try:
+            url = f"{self.base_url}/{model}:generateContent?key={self.api_key}"
+            payload = self._build_payload(prompt, max_tokens, temperature, task)
+            return self._parse_response(await self._post(url, payload), task)
+        except CircuitOpenError as e:
+            return {"error": f"API Error: {str(e)}"}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {"error": f"API Error: {str(e) or type(e).__name__}"}
+        except Exception as e:
+            return {"error": f"Unexpected Error: {str(e)}"}
+
+    async def _post(self, url, payload):
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError("Gemini API circuit is open after repeated failures")
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._session.post(url, json=payload) as response:
+                        if response.status in GeminiTransport.RETRY_STATUSES and attempt < self.max_retries:
+                            retry_after = response.headers.get("Retry-After")
+                        else:
+                            # Same rule as GeminiTransport.post: only retryable statuses that exhausted their
+                            # retries count against the circuit; a 400 or 403 means the service is up
+                            if response.status in GeminiTransport.RETRY_STATUSES:
+                                self.circuit_breaker.record_failure()
+                            else:
+                                self.circuit_breaker.record_success()
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    self.circuit_breaker.record_failure()
+                    raise
+                retry_after = None
+            await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after))
+            attempt += 1
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncRunner:
+    """Runs a private asyncio event loop on a daemon thread so sync Flask views can hand it coroutines"""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-runner", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+class JobStore:
+    """In-memory registry of background generation jobs, pruned once finished jobs expire"""
+    def __init__(self, ttl=60 * 60):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_type, **params):
+        job = {
+            "id": uuid.uuid4().hex,
+            "type": job_type,
+            "params": params,
+            "status": "pending",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job["id"]] = job
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                if fields.get("status") in ("done", "failed"):
+                    job["finished_at"] = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _prune(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class GenerationError(Exception):
+    """Raised by a background job when Gemini returns an error instead of content"""
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds its maximum number of pending jobs"""
+
+
+class JobQueue:
+    """Bounded queue of background generation jobs run on a thread pool or the async runner"""
+    def __init__(self, jobs, max_workers=4, max_pending=32, async_runner=None):
+        self.jobs = jobs
+        self.max_pending = max_pending
+        self.async_runner = async_runner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, job_type, params):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise QueueFullError(f"{self.pending} jobs already pending")
+            self.pending += 1
+        return self.jobs.create(job_type, **params)
+
+    def _finish(self, job_id, result=None, error=None):
+        if error is None:
+            self.jobs.update(job_id, status="done", result=result)
+        else:
+            self.jobs.update(job_id, status="failed", error=str(error))
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, job_type, fn, **params):
+        """Run `fn` on a worker thread; its return value becomes the job result"""
+        job = self._reserve(job_type, params)
+        self.executor.submit(self._run, job["id"], fn)
+        return job
+
+    def _run(self, job_id, fn):
+        self.jobs.update(job_id, status="running")
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(job_id, error=e)
+        else:
+            self._finish(job_id, result=result)
+
+    def submit_coroutine(self, job_type, coro_fn, **params):
+        """Run the coroutine returned by `coro_fn` on the async runner without tying up a worker thread"""
+        job = self._reserve(job_type, params)
+        self.async_runner.submit(self._run_coroutine(job["id"], coro_fn))
+        return job
+
+    async def _run_coroutine(self, job_id, coro_fn):
+        self.jobs.update(job_id, status="running")
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self._finish(job_id, error=e)
+        else:
+            self._finish(job_id, result=result)
+
 
 class MCQGenerator:
     def __init__(self, gemini_client):
         self.gemini_client = gemini_client
 
     def generate_mcqs(self, step_content):
-        prompt = f"""
-    Based on the following educational content, create 3 multiple-choice questions that test understanding of key concepts.
-    
-    CONTENT:
-    {step_content}
-    
-    FORMAT YOUR RESPONSE AS JSON WITH THE FOLLOWING STRUCTURE ONLY:
-    {{
-        "questions": [
-            {{
-                "question": "Question text here?",
-                "options": ["Option A", "Option B", "Option C", "Option D"],
-                "correctIndex": 0,
-                "explanation": "Brief explanation of why this answer is correct"
-            }}
-        ]
-    }}
-    
-    IMPORTANT: Your response MUST be a valid JSON object containing ONLY a 'questions' array.
-    Make sure each question has EXACTLY 4 options. The correctIndex should be the index (0-3) of the correct answer.
-    """
-    
-        response = self.gemini_client.send_prompt(prompt, max_tokens=1500, temperature=0.3)
-    
+        # Concurrent requests for identical content already share one call inside send_prompt
+        response = self.gemini_client.send_prompt(step_content, max_tokens=1500, temperature=0.3, task="mcq")
+        return self._validate_response(response, step_content)
+
+    async def generate_mcqs_async(self, step_content, async_client):
+        """Async variant of generate_mcqs that awaits an AsyncGeminiClient"""
+        response = await async_client.send_prompt(step_content, max_tokens=1500, temperature=0.3, task="mcq")
+        return self._validate_response(response, step_content)
+
+    def _validate_response(self, response, step_content):
          # Handle possible errors or unexpected response structure
         if isinstance(response, dict):
             if "error" in response:
-                print(f"Error in MCQ generation: {response['error']}")
+                logger.warning("Error in MCQ generation: %s", response['error'])
                 return {"questions": []}
             elif "questions" in response:
             # We have the expected structure
                 valid_questions = []
                 for q in response.get("questions", []):
                     if not all(k in q for k in ["question", "options", "correctIndex"]):
-                        print(f"Skipping invalid question format: {q}")
+                        logger.info("Skipping invalid question format: %s", q)
                         continue
                 # Ensure correctIndex is valid
                     if not isinstance(q["correctIndex"], int) or q["correctIndex"] < 0 or q["correctIndex"] >= len(q.get("options", [])):
@@ -195,88 +836,291 @@ class MCQGenerator:
                 return {"questions": valid_questions}
             else:
             # Unexpected response structure - create default questions based on content
-                print(f"Unexpected MCQ response structure: {response}")
+                logger.warning("Unexpected MCQ response structure: %s", response)
                 return self._create_default_questions(step_content)
     
     # If we get here, something went wrong
-        print(f"Invalid response type from MCQ generation: {type(response)}")
+        logger.warning("Invalid response type from MCQ generation: %s", type(response))
         return {"questions": []}
 
-def _create_default_questions(self, content):
-    """Create basic default questions when API fails to return proper format"""
-    # Extract title if available in content
-    title = content.split('\n')[0] if '\n' in content else "This topic"
-    
-    return {
-        "questions": [
-            {
-                "question": f"What is the main purpose of {title}?",
-                "options": [
-                    "To understand core concepts", 
-                    "To practice implementation", 
-                    "To learn advanced techniques", 
-                    "To debug common issues"
-                ],
-                "correctIndex": 0,
-                "explanation": "Understanding core concepts is the foundation of learning."
-            }
+    def _create_default_questions(self, content):
+        """Create basic default questions when API fails to return proper format"""
+        # Extract title if available in content
+        title = content.split('\n')[0] if '\n' in content else "This topic"
+
+        return {
+            "questions": [
+                {
+                    "question": f"What is the main purpose of {title}?",
+                    "options": [
+                        "To understand core concepts", 
+                        "To practice implementation", 
+                        "To learn advanced techniques", 
+                        "To debug common issues"
+                    ],
+                    "correctIndex": 0,
+                    "explanation": "Understanding core concepts is the foundation of learning."
+                }
+            ]
+        }
+
+    def generate_mcqs_batch(self, step_contents, batch_size=5):
+        """Generate questions for many steps with one prompt per `batch_size` steps, run in parallel.
+        Returns one {"questions": [...]} per step, empty for steps the model skipped"""
+        chunks = [step_contents[i:i + batch_size] for i in range(0, len(step_contents), batch_size)]
+        if not chunks:
+            return []
+        with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix="mcq-batch") as pool:
+            results = list(pool.map(self._generate_mcq_chunk, chunks))
+        return [mcqs for chunk in results for mcqs in chunk]
+
+    def _generate_mcq_chunk(self, step_contents):
+        response = self.gemini_client.send_prompt(
+            self._build_batch_prompt(step_contents),
+            max_tokens=min(8192, 700 * len(step_contents)),
+            temperature=0.3,
+            task="mcq_batch"
+        )
+        if not isinstance(response, dict) or "error" in response:
+            logger.warning("Error in batched MCQ generation: %s", response.get('error') if isinstance(response, dict) else response)
+            return [{"questions": []} for _ in step_contents]
+        by_step = {}
+        for entry in response.get("steps", []):
+            if isinstance(entry, dict) and isinstance(entry.get("step"), int):
+                by_step[entry["step"]] = {"questions": entry.get("questions") or []}
+        return [
+            self._validate_response(by_step.get(number, {"questions": []}), content)
+            for number, content in enumerate(step_contents, start=1)
         ]
-    }
+
+    def _build_batch_prompt(self, step_contents):
+        return "\n\n".join(f"STEP {number}:\n{content}" for number, content in enumerate(step_contents, start=1))
 
 
 # Flask App Setup
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = os.getenv("SECRET_KEY", "dev_secret_key")
+# The session cookie carries the visitor's user id, so it should outlive the browser session
+app.config["PERMANENT_SESSION_LIFETIME"] = datetime.timedelta(days=365)
+
+# Static URLs carry a content hash (?v=...), so versioned requests can be cached for a year
+STATIC_MAX_AGE = 365 * 24 * 3600
+static_assets = StaticAssets(app.static_folder)
+
+def build_id():
+    """Hash of the templates and static files; part of every page ETag, so a deploy invalidates cached pages"""
+    digest = hashlib.sha1()
+    for root in (os.path.join(app.root_path, app.template_folder), app.static_folder):
+        for directory, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith((".gz", ".br", ".tmp")):
+                    continue
+                with open(os.path.join(directory, name), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:12]
 
-gemini_client = GeminiClient()
+BUILD_ID = build_id()
+
+gemini_client = GeminiClient(cache=create_response_cache())
 mcq_generator = MCQGenerator(gemini_client)
+mcq_flight = SingleFlight()
+# Background question generation for whole plans, keyed by mcq_batch_key()
+mcq_batches = SingleFlight()
+MCQ_PREGENERATE = os.getenv("MCQ_PREGENERATE", "1") != "0"
+MCQ_BATCH_SIZE = int(os.getenv("MCQ_BATCH_SIZE", 5))
+# Seconds a quiz request waits on its plan's running batch before generating alone
+MCQ_BATCH_WAIT = float(os.getenv("MCQ_BATCH_WAIT", 30))
+
+# Async generation runs on its own event loop thread, sharing the response cache with the sync client
+async_gemini_client = AsyncGeminiClient.from_env(cache=gemini_client.cache) if aiohttp is not None else None
+async_runner = AsyncRunner() if async_gemini_client is not None else None
+generation_jobs = JobStore()
+job_queue = JobQueue(
+    generation_jobs,
+    max_workers=int(os.getenv("JOB_WORKERS", 4)),
+    max_pending=int(os.getenv("JOB_QUEUE_SIZE", 32)),
+    async_runner=async_runner
+)
+# Pre-generation is optional work, so it gets its own workers and limit rather than taking
+# slots from the plan jobs users are waiting on
+mcq_queue = JobQueue(
+    generation_jobs,
+    max_workers=int(os.getenv("MCQ_WORKERS", 2)),
+    max_pending=int(os.getenv("MCQ_QUEUE_SIZE", 64))
+)
+
+def response_cache_lookups():
+    stats = gemini_client.cache.stats() if gemini_client.cache is not None else {"hits": 0, "misses": 0}
+    return [(("hit",), stats["hits"]), (("miss",), stats["misses"])]
+
+metrics.callback("gemini_response_cache_lookups_total", "Gemini response cache lookups",
+                 response_cache_lookups, labels=["result"], type="counter")
+metrics.callback("job_queue_pending", "Background generation jobs queued or running",
+                 lambda: [((), job_queue.pending)])
+metrics.callback("mcq_queue_pending", "Quiz pre-generation jobs queued or running",
+                 lambda: [((), mcq_queue.pending)])
 
 # Directory for storing user data locally
-DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_data")
+DATA_DIR = os.getenv("USER_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_data"))
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def get_user_data_path(user_id="default"):
-    return os.path.join(DATA_DIR, f"{user_id}_data.json")
+def create_user_store():
+    """Build the user data backend selected by USER_STORE_BACKEND (json or sqlite)"""
+    max_bytes = int(os.getenv("USER_MAX_BYTES", 5 * 1024 * 1024)) or None
+    if os.getenv("USER_STORE_BACKEND", "json") == "sqlite":
+        return SQLiteUserStore(os.getenv("USER_STORE_PATH", os.path.join(DATA_DIR, "user_data.db")), max_bytes=max_bytes)
+    return JSONUserStore(
+        DATA_DIR,
+        cache_size=int(os.getenv("USER_CACHE_SIZE", 1024)),
+        write_behind=float(os.getenv("USER_WRITE_BEHIND", 0)),
+        max_bytes=max_bytes
+    )
 
-def load_user_data(user_id="default"):
-    file_path = get_user_data_path(user_id)
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            pass
-    return {"skills": [], "streaks": [], "last_active": None}
+user_store = create_user_store()
 
-def save_user_data(data, user_id="default"):
-    file_path = get_user_data_path(user_id)
-    with open(file_path, 'w') as f:
-        json.dump(data, f)
+# Set to e.g. "default" to keep every visitor on one shared profile, as before sessions had ids
+SHARED_USER_ID = os.getenv("SHARED_USER_ID")
+if SHARED_USER_ID and not re.fullmatch(r"[A-Za-z0-9_-]+", SHARED_USER_ID):
+    raise ValueError("SHARED_USER_ID may only contain letters, digits, '_' and '-'")
+
+# User ids end up in file names, so only ids this app could have issued are accepted
+USER_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+def current_user_id():
+    """User id of this browser, assigned on its first visit and kept in the signed session cookie"""
+    if SHARED_USER_ID:
+        return SHARED_USER_ID
+    user_id = session.get("user_id")
+    if not isinstance(user_id, str) or not USER_ID_PATTERN.fullmatch(user_id):
+        user_id = session["user_id"] = uuid.uuid4().hex
+        session.permanent = True
+        g.new_user = True
+    return user_id
+
+def load_user_data(user_id="default"):
+    return user_store.load(user_id)
 
 def update_streak(user_id="default"):
-    user_data = load_user_data(user_id)
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    if "streaks" not in user_data:
-        user_data["streaks"] = []
-    if user_data.get("last_active") == today:
-        return len(user_data["streaks"])
-    if user_data.get("last_active"):
-        last_active_date = datetime.datetime.strptime(user_data["last_active"], "%Y-%m-%d")
-        today_date = datetime.datetime.strptime(today, "%Y-%m-%d")
-        if (today_date - last_active_date).days == 1:
-            user_data["streaks"].append(today)
+    with user_store.locked(user_id):
+        streaks, last_active = user_store.get_activity(user_id)
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        if last_active == today:
+            return len(streaks)
+        if last_active:
+            last_active_date = datetime.datetime.strptime(last_active, "%Y-%m-%d")
+            today_date = datetime.datetime.strptime(today, "%Y-%m-%d")
+            if (today_date - last_active_date).days == 1:
+                streaks.append(today)
+            else:
+                streaks = [today]
         else:
-            user_data["streaks"] = [today]
-    else:
-        user_data["streaks"].append(today)
-    user_data["last_active"] = today
-    save_user_data(user_data, user_id)
-    return len(user_data["streaks"])
+            streaks.append(today)
+        user_store.set_activity(user_id, streaks, today)
+        return len(streaks)
+
+@app.cli.command("migrate-user-data")
+def migrate_user_data_command():
+    """Import the JSON files in user_data/ into the SQLite user store"""
+    sqlite_store = user_store if isinstance(user_store, SQLiteUserStore) else SQLiteUserStore(
+        os.getenv("USER_STORE_PATH", os.path.join(DATA_DIR, "user_data.db")))
+    migrated = migrate_json_to_sqlite(JSONUserStore(DATA_DIR), sqlite_store)
+    print(f"Migrated {len(migrated)} user(s) into {sqlite_store.path}")
+
+@app.cli.command("compress-static")
+def compress_static_command():
+    """Write gzip (and, with brotli installed, brotli) copies of the static text assets"""
+    count = static_assets.compress_all()
+    print(f"Compressed {count} static file(s)")
+
+@app.cli.command("compact-user-data")
+def compact_user_data_command():
+    """Drop stored quiz questions of completed steps for every user"""
+    dropped = sum(user_store.compact(user_id) for user_id in user_store.user_ids())
+    print(f"Removed {dropped} stored MCQ set(s)")
+
+@app.template_filter('skill_id')
+def skill_id_filter(skill):
+    """URL id of a skill, including skills stored before ids were assigned"""
+    return skill_key(skill)
+
+@app.url_defaults
+def version_static_urls(endpoint, values):
+    if endpoint == "static" and "filename" in values and "v" not in values:
+        version = static_assets.version(values["filename"])
+        if version:
+            values["v"] = version
+
+def serve_static(filename):
+    """Static files, precompressed when the browser accepts it and cached for a year when versioned"""
+    response = None
+    variants = static_assets.variants(filename)
+    for encoding, variant in variants:
+        if request.accept_encodings[encoding]:
+            response = send_from_directory(app.static_folder, variant,
+                                           mimetype=mimetypes.guess_type(filename)[0])
+            response.headers["Content-Encoding"] = encoding
+            break
+    if response is None:
+        response = send_from_directory(app.static_folder, filename)
+    if variants:
+        response.vary.add("Accept-Encoding")
+    version = request.args.get("v")
+    if version and version == static_assets.version(filename):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+app.view_functions["static"] = serve_static
+
+class StaticlessSessionInterface(SecureCookieSessionInterface):
+    """Signed-cookie sessions that leave static responses alone.
+
+    The permanent session cookie is refreshed on every request, and the
+    Set-Cookie and Vary: Cookie that come with it would stop shared caches
+    and CDNs from storing year-long static responses.
+    """
+    def save_session(self, app, session, response):
+        if request.endpoint == "static":
+            return
+        super().save_session(app, session, response)
+
+app.session_interface = StaticlessSessionInterface()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unmatched",
+                             method=request.method, status=response.status_code)
+    return response
+
+@app.errorhandler(UserDataTooLarge)
+def user_data_too_large(error):
+    logger.warning("%s", error)
+    message = "Your saved learning data is too large. Remove a skill and try again."
+    if request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html":
+        return render_template('error.html', error=message), 413
+    return jsonify({"error": message}), 413
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target"""
+    return Response(metrics.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/')
 def index():
-    user_id = session.get('user_id', 'default')
-    streak = update_streak(user_id)
+    user_id = current_user_id()
+    # A visit that was just given an id (crawlers, health checks) stores nothing; the streak starts next time
+    streak = 0 if g.get("new_user") else update_streak(user_id)
     user_data = load_user_data(user_id)
     return render_template('home.html', skills=user_data.get("skills", []), streak=streak)
 
@@ -290,12 +1134,38 @@ def learn():
 
 @app.route('/generate-plan/<skill>')
 def generate_skill_plan(skill):
-    user_id = session.get('user_id', 'default')
+    user_id = current_user_id()
     learning_plan = gemini_client.send_prompt(skill)
     if "error" in learning_plan:
         return render_template('error.html', error=learning_plan["error"])
     
-    user_data = load_user_data(user_id)
+    skill_id = store_learning_plan(learning_plan, user_id)
+    return redirect(url_for('view_skill', skill_id=skill_id))
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/stream-plan/<skill>')
+def stream_skill_plan(skill):
+    """Stream a new plan to the browser over Server-Sent Events, one step at a time"""
+    user_id = current_user_id()
+    
+    def generate():
+        for event, payload in gemini_client.stream_plan(skill):
+            if event == "done":
+                skill_id = store_learning_plan(payload, user_id)
+                yield sse_event("done", {"skill_id": skill_id, "redirect": url_for_skill(skill_id)})
+            elif event == "error":
+                # "error" is reserved by EventSource for connection failures
+                yield sse_event("failed", payload)
+            else:
+                yield sse_event(event, payload)
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def store_learning_plan(learning_plan, user_id="default"):
+    """Initialise progress fields on a freshly generated plan and save it for the user; returns its skill_id"""
     for step in learning_plan.get("steps", []):
         step["progress"] = 0
         step["status"] = "not_started"
@@ -305,33 +1175,55 @@ def generate_skill_plan(skill):
         for sub_step in step.get("sub_steps", []):
             if "status" not in sub_step:
                 sub_step["status"] = "not_started"
+        step["sub_step_counts"] = status_counts(step["sub_steps"])
     
     learning_plan["overall_progress"] = 0
+    learning_plan["step_counts"] = status_counts(learning_plan.get("steps", []))
     learning_plan["created_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    existing_skills = [s for s in user_data.get("skills", []) if s.get("skill_name") == learning_plan.get("skill_name")]
-    if existing_skills:
-        existing_skills.update(learning_plan)
+    # Regenerating a plan for the same skill replaces the stored one and keeps its skill_id
+    skill_id = user_store.save_skill(user_id, learning_plan)
+    schedule_mcq_pregeneration(user_id, skill_id, learning_plan["created_at"])
+    return skill_id
+
+def cached_skill_response(user_id, skill, view, render):
+    """Respond 304 when the browser's copy of this view of the skill is current, else render() it.
+
+    The ETag comes from the skill's version (bumped on every write) and the
+    build id, so nothing is rendered or serialized to validate a cached copy.
+    """
+    etag = hashlib.sha1(
+        f"{user_id}:{skill_key(skill)}:{skill.get('version', 0)}:{view}:{BUILD_ID}".encode("utf-8")
+    ).hexdigest()
+    updated_at = skill.get("updated_at")
+    last_modified = datetime.datetime.fromtimestamp(updated_at, datetime.timezone.utc) if updated_at else None
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
     else:
-        user_data.setdefault("skills", []).append(learning_plan)
-    
-    save_user_data(user_data, user_id)
-    return redirect(url_for('view_skill', skill_id=learning_plan.get("skill_name")))
+        # If-Modified-Since only counts when the browser sent no ETag to compare
+        not_modified = (last_modified is not None and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+    response = Response(status=304) if not_modified else make_response(render())
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Pages belong to one user and must be revalidated, which is cheap
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/skill/<skill_id>')
 def view_skill(skill_id):
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
-    skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
+    user_id = current_user_id()
+    skill = user_store.get_skill(user_id, skill_id)
     if not skill:
         return render_template('error.html', error="Skill not found")
-    return render_template('skill.html', skill=skill)
+    return cached_skill_response(user_id, skill, "skill", lambda: render_template('skill.html', skill=skill))
 
 @app.route('/step/<skill_id>/<int:step_index>')
 def view_step(skill_id, step_index):
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
-    skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
+    user_id = current_user_id()
+    skill = user_store.get_skill(user_id, skill_id)
     if not skill or step_index >= len(skill.get("steps", [])):
         return render_template('error.html', error="Step not found")
     
@@ -339,129 +1231,365 @@ def view_step(skill_id, step_index):
     next_step_index = step_index + 1 if step_index + 1 < len(skill["steps"]) else None
     prev_step_index = step_index - 1 if step_index > 0 else None
     
-    return render_template('step.html', skill=skill, step=step,
-                           step_index=step_index,
-                           next_step_index=next_step_index,
-                           prev_step_index=prev_step_index)
-
-@app.route('/static/js/step-navigation.js')
-def step_navigation_js():
-    """Serve the new step navigation JavaScript file"""
-    return send_file('static/js/step-navigation.js')
+    return cached_skill_response(user_id, skill, f"step:{step_index}", lambda: render_template(
+        'step.html', skill=skill, step=step,
+        step_index=step_index,
+        next_step_index=next_step_index,
+        prev_step_index=prev_step_index))
 
 @app.route('/check-step/<skill_id>/<int:step_index>')
 def check_step_exists(skill_id, step_index):
     """Check if a step exists for the given skill"""
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
-    skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
+    user_id = current_user_id()
+    skill = user_store.get_skill(user_id, skill_id)
     if not skill or step_index >= len(skill.get("steps", [])):
         return jsonify({"exists": False})
     return jsonify({"exists": True})
 
-# Modify the update_progress function to handle completion status better
-@app.route('/update-progress', methods=['POST'])
-def update_progress():
-    data = request.json
-    skill_id, step_index, substep_index, status = data.get('skill_id'), data.get('step_index'), data.get('substep_index'), data.get('status')
-    
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
-    
-    skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
-    if not skill or int(step_index) >= len(skill.get("steps", [])):
-        return jsonify({"error": "Invalid skill or step index"})
-    
-    step = skill["steps"][int(step_index)]
+# Progress is kept as maintained counters (skill["step_counts"], step["sub_step_counts"])
+# that are adjusted on each status transition instead of recounted on every click
+STATUS_PROGRESS = {"not_started": 0, "in_progress": 50, "completed": 100}
+
+def status_counts(items):
+    counts = {"completed": 0, "in_progress": 0}
+    for item in items:
+        if item.get("status") in counts:
+            counts[item["status"]] += 1
+    return counts
+
+def adjust_counts(counts, old_status, new_status):
+    if old_status in counts:
+        counts[old_status] -= 1
+    if new_status in counts:
+        counts[new_status] += 1
+
+def weighted_progress(counts, total):
+    # Calculate weighted progress (completed = 100%, in_progress = 50%)
+    return int(((counts["completed"] + (counts["in_progress"] * 0.5)) / total) * 100)
+
+def parse_index(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def apply_status_change(skill, step_index, sub_index, status, changes):
+    """Apply one status transition to an in-memory skill and record the touched fields in `changes`"""
+    # Skills stored before the counters existed are counted once, then maintained from here on
+    if "step_counts" not in skill:
+        skill["step_counts"] = status_counts(skill["steps"])
+    step = skill["steps"][step_index]
+    adjust_counts(skill["step_counts"], step.get("status"), status)
     step["status"] = status
     
     # Handle substep progress if applicable
-    if substep_index is not None and int(substep_index) < len(step.get("sub_steps", [])):
-        sub_step = step["sub_steps"][int(substep_index)]
+    if sub_index is not None and sub_index < len(step.get("sub_steps", [])):
+        if "sub_step_counts" not in step:
+            step["sub_step_counts"] = status_counts(step["sub_steps"])
+        sub_step = step["sub_steps"][sub_index]
+        adjust_counts(step["sub_step_counts"], sub_step.get("status"), status)
         sub_step["status"] = status
-        
-        # Calculate step progress based on substeps
-        if step.get("sub_steps") and len(step["sub_steps"]) > 0:
-            completed_substeps = sum(1 for sub in step["sub_steps"] if sub.get("status") == "completed")
-            in_progress_substeps = sum(1 for sub in step["sub_steps"] if sub.get("status") == "in_progress")
-            total_substeps = len(step["sub_steps"])
-            
-            # Calculate weighted progress (completed = 100%, in_progress = 50%)
-            step["progress"] = int(((completed_substeps + (in_progress_substeps * 0.5)) / total_substeps) * 100)
-    else:
+        step["progress"] = weighted_progress(step["sub_step_counts"], len(step["sub_steps"]))
+        changes["sub_steps"][(step_index, sub_index)] = {"status": status}
+    elif status in STATUS_PROGRESS:
         # If no substeps, set progress based on status
-        if status == "not_started":
-            step["progress"] = 0
-        elif status == "in_progress":
-            step["progress"] = 50
-        elif status == "completed":
-            step["progress"] = 100
-    
-    # Calculate overall progress with weighted values
-    total_steps = len(skill["steps"])
-    completed_steps = sum(1 for s in skill["steps"] if s.get("status") == "completed")
-    in_progress_steps = sum(1 for s in skill["steps"] if s.get("status") == "in_progress")
-    
-    # Calculate weighted progress (completed = 100%, in_progress = 50%)
-    skill["overall_progress"] = int(((completed_steps + (in_progress_steps * 0.5)) / total_steps) * 100)
+        step["progress"] = STATUS_PROGRESS[status]
     
-    save_user_data(user_data, user_id)
+    # Merge, so a later update in the same batch keeps the counters an earlier one changed
+    step_changes = changes["steps"].setdefault(step_index, {})
+    step_changes.update({"status": status, "progress": step.get("progress", 0)})
+    if "sub_step_counts" in step:
+        step_changes["sub_step_counts"] = step["sub_step_counts"]
     
+    skill["overall_progress"] = weighted_progress(skill["step_counts"], len(skill["steps"]))
+    changes["skill"] = {"overall_progress": skill["overall_progress"], "step_counts": skill["step_counts"]}
+    return step.get("progress", 0), skill["overall_progress"]
+
+def apply_progress_updates(user_id, updates):
+    """Apply a list of {skill_id, step_index, substep_index, status} updates with one write per skill"""
+    results = []
+    skills, changes = {}, {}
+    # Hold the user's lock so concurrent clicks cannot compute progress from stale data
+    with user_store.locked(user_id):
+        for update in updates:
+            # Each malformed item fails on its own instead of failing the whole batch
+            if (not isinstance(update, dict) or not isinstance(update.get('skill_id'), str)
+                    or not isinstance(update.get('status'), str)):
+                results.append({"error": "Invalid progress update"})
+                continue
+            skill_id = update['skill_id']
+            if skill_id not in skills:
+                skill = user_store.get_skill(user_id, skill_id)
+                # The stored skill may be a shared cached copy
+                skills[skill_id] = copy.deepcopy(skill) if skill else None
+                changes[skill_id] = {"steps": {}, "sub_steps": {}, "skill": {}}
+            skill = skills[skill_id]
+            step_index = parse_index(update.get('step_index'))
+            if not skill or step_index is None or not 0 <= step_index < len(skill.get("steps", [])):
+                results.append({"error": "Invalid skill or step index"})
+                continue
+            step_progress, overall_progress = apply_status_change(
+                skill, step_index, parse_index(update.get('substep_index')), update.get('status'), changes[skill_id]
+            )
+            results.append({
+                "skill_id": skill_id,
+                "step_index": step_index,
+                "step_progress": step_progress,
+                "overall_progress": overall_progress
+            })
+        # Only the touched steps, sub-steps and skill totals are written back
+        for skill_id, skill_changes in changes.items():
+            if skill_changes["steps"]:
+                user_store.write_progress_many(
+                    user_id, skill_id, skill_changes["steps"],
+                    sub_fields=skill_changes["sub_steps"], skill_fields=skill_changes["skill"]
+                )
+    return results
+
+@app.route('/update-progress', methods=['POST'])
+def update_progress():
+    user_id = current_user_id()
+    result = apply_progress_updates(user_id, [request.json])[0]
+    if "error" in result:
+        return jsonify(result)
     return jsonify({
         "success": True,
-        "step_progress": step["progress"],
-        "overall_progress": skill["overall_progress"]
+        "step_progress": result["step_progress"],
+        "overall_progress": result["overall_progress"]
     })
 
+@app.route('/update-progress/batch', methods=['POST'])
+def update_progress_batch():
+    """Apply many queued status changes from one POST: {"updates": [{skill_id, step_index, substep_index, status}, ...]}"""
+    data = request.get_json(force=True, silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list):
+        return jsonify({"error": "Expected an 'updates' list"}), 400
+    user_id = current_user_id()
+    return jsonify({"success": True, "results": apply_progress_updates(user_id, updates)})
+
+
+def step_content(step):
+    return f"{step.get('title', '')} {step.get('explanation', '')} {step.get('exercise', '')} {step.get('tip', '')}"
+
+def has_mcqs(step):
+    return bool((step.get("mcqs") or {}).get("questions"))
+
+def generate_and_store_mcqs(user_id, skill_id, step_index, step):
+    """Generate MCQs for a step and persist them on the user's skill"""
+    mcqs = mcq_generator.generate_mcqs(step_content(step))
+    
+    # Ensure we have a valid questions array
+    if not isinstance(mcqs, dict):
+        mcqs = {"questions": []}
+    elif not isinstance(mcqs.get("questions", []), list):
+        mcqs = {"questions": []}
+    
+    store_step_mcqs(mcqs, user_id, skill_id, step_index)
+    return mcqs
+
+def store_step_mcqs(mcqs, user_id, skill_id, step_index):
+    # Only the step's questions are written, so progress saved while we were waiting on Gemini is kept
+    user_store.set_step_mcqs(user_id, skill_id, step_index, mcqs)
+
+def mcq_batch_key(user_id, skill_id, plan_created_at):
+    # A regenerated plan keeps its skill_id, so its created_at tells it apart from the plan it replaced
+    return (user_id, skill_id, plan_created_at)
+
+def pregenerate_mcqs(user_id, skill_id, plan_created_at):
+    """Generate and store questions for every step of a plan that has none yet"""
+    skill = user_store.get_skill(user_id, skill_id)
+    if not skill or skill.get("created_at") != plan_created_at:
+        return {"skill_id": skill_id, "steps": []}
+    pending = [index for index, step in enumerate(skill.get("steps", [])) if not has_mcqs(step)]
+    batches = mcq_generator.generate_mcqs_batch(
+        [step_content(skill["steps"][index]) for index in pending], batch_size=MCQ_BATCH_SIZE
+    )
+    
+    with user_store.locked(user_id):
+        skill = user_store.get_skill(user_id, skill_id)
+        # The plan was regenerated meanwhile; these questions belong to steps that are gone
+        if not skill or skill.get("created_at") != plan_created_at:
+            return {"skill_id": skill_id, "steps": []}
+        steps = skill.get("steps", [])
+        # Steps opened while the batch was generating keep the questions they already got
+        fresh = {
+            index: mcqs for index, mcqs in zip(pending, batches)
+            if mcqs["questions"] and index < len(steps) and not has_mcqs(steps[index])
+        }
+        if fresh:
+            user_store.set_mcqs_many(user_id, skill_id, fresh)
+    return {"skill_id": skill_id, "steps": sorted(fresh)}
+
+def schedule_mcq_pregeneration(user_id, skill_id, plan_created_at):
+    """Queue question generation for a new plan so its quizzes open instantly"""
+    if not MCQ_PREGENERATE:
+        return None
+    # The batch only counts as in flight once a worker runs it, so quizzes opened while it is
+    # still queued generate their own questions and the batch then skips those steps
+    key = mcq_batch_key(user_id, skill_id, plan_created_at)
+    try:
+        return mcq_queue.submit(
+            "mcqs",
+            lambda: mcq_batches.do(key, lambda: pregenerate_mcqs(user_id, skill_id, plan_created_at)),
+            user_id=user_id,
+            skill_id=skill_id
+        )
+    except QueueFullError:
+        # Quizzes still get generated one step at a time when they are opened
+        logger.warning("Skipping MCQ pre-generation for %s: queue is full", skill_id)
+        return None
 
 @app.route('/get-mcqs/<skill_id>/<step_index>')
 def get_mcqs(skill_id, step_index):
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
-    
+    user_id = current_user_id()
     try:
         step_index = int(step_index)
-        skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
+        skill = user_store.get_skill(user_id, skill_id)
         
         if not skill or step_index >= len(skill.get("steps", [])):
             return jsonify({"questions": []})
         
         step = skill["steps"][step_index]
         
+        # A plan's questions may still be generating in the background; wait rather than ask twice
+        batch_key = mcq_batch_key(user_id, skill_id, skill.get("created_at"))
+        if not has_mcqs(step) and mcq_batches.wait(batch_key, timeout=MCQ_BATCH_WAIT):
+            skill = user_store.get_skill(user_id, skill_id)
+            step = skill["steps"][step_index]
+        
         # Generate MCQs if not already present
-        if "mcqs" not in step or not step.get("mcqs", {}).get("questions"):
-            step_content = f"{step.get('title', '')} {step.get('explanation', '')} {step.get('exercise', '')} {step.get('tip', '')}"
-            mcqs = mcq_generator.generate_mcqs(step_content)
-            
-            # Ensure we have a valid questions array
-            if not isinstance(mcqs, dict):
-                mcqs = {"questions": []}
-            elif not isinstance(mcqs.get("questions", []), list):
-                mcqs = {"questions": []}
-                
-            step["mcqs"] = mcqs
-            save_user_data(user_data, user_id)
+        if not has_mcqs(step):
+            # Concurrent requests for the same step share one generation and one save
+            mcqs = mcq_flight.do(
+                (user_id, skill_id, step_index),
+                lambda: generate_and_store_mcqs(user_id, skill_id, step_index, step)
+            )
+            return jsonify(mcqs)
         
-        return jsonify(step.get("mcqs", {"questions": []}))
-    except Exception as e:
-        print(f"Error generating MCQs: {str(e)}")
+        # Stored questions only change with the skill's version, so repeat visits can get a 304
+        return cached_skill_response(user_id, skill, f"mcqs:{step_index}", lambda: jsonify(step["mcqs"]))
+    except Exception:
+        logger.exception("Error generating MCQs")
         return jsonify({"questions": []})
+def run_plan_job(skill, user_id):
+    learning_plan = gemini_client.send_prompt(skill)
+    if "error" in learning_plan:
+        raise GenerationError(learning_plan["error"])
+    skill_id = store_learning_plan(learning_plan, user_id)
+    return {"skill_id": skill_id, "redirect": url_for_skill(skill_id)}
+
+async def run_plan_job_async(skill, user_id):
+    learning_plan = await async_gemini_client.send_prompt(skill)
+    if "error" in learning_plan:
+        raise GenerationError(learning_plan["error"])
+    # File I/O stays off the event loop
+    loop = asyncio.get_running_loop()
+    skill_id = await loop.run_in_executor(None, store_learning_plan, learning_plan, user_id)
+    return {"skill_id": skill_id, "redirect": url_for_skill(skill_id)}
+
+async def run_mcq_job_async(user_id, skill_id, step_index, step):
+    mcqs = await mcq_generator.generate_mcqs_async(step_content(step), async_gemini_client)
+    if not isinstance(mcqs, dict) or not isinstance(mcqs.get("questions", []), list):
+        mcqs = {"questions": []}
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, store_step_mcqs, mcqs, user_id, skill_id, step_index)
+    return mcqs
+
+def url_for_skill(skill_id):
+    # Jobs finish outside a request context, so the URL is built by hand
+    return f"/skill/{quote(skill_id)}"
+
+def job_accepted(job):
+    return jsonify({
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": url_for('get_job', job_id=job["id"])
+    }), 202
+
+def queue_full_response():
+    response = jsonify({"error": "Too many generations in progress, please retry shortly"})
+    response.status_code = 429
+    response.headers["Retry-After"] = "5"
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a plan generation and return its job id; answers 429 when the queue is full"""
+    data = request.get_json(silent=True) or request.form
+    job_type = data.get('type', 'plan')
+    skill = (data.get('skill') or "").strip()
+    if job_type != 'plan' or not skill:
+        return jsonify({"error": "Expected a 'plan' job with a 'skill'"}), 400
+    user_id = current_user_id()
+    try:
+        job = job_queue.submit("plan", lambda: run_plan_job(skill, user_id), skill=skill)
+    except QueueFullError:
+        return queue_full_response()
+    return job_accepted(job)
+
+@app.route('/async/generate-plan/<skill>', methods=['POST'])
+def generate_skill_plan_async(skill):
+    """Start plan generation on the async client and return a job id to poll"""
+    if async_gemini_client is None:
+        return jsonify({"error": "Async generation is unavailable (aiohttp is not installed)"}), 501
+    user_id = current_user_id()
+    try:
+        job = job_queue.submit_coroutine("plan", lambda: run_plan_job_async(skill, user_id), skill=skill)
+    except QueueFullError:
+        return queue_full_response()
+    return job_accepted(job)
+
+@app.route('/async/get-mcqs/<skill_id>/<int:step_index>', methods=['POST'])
+def get_mcqs_async(skill_id, step_index):
+    """Start MCQ generation for a step on the async client and return a job id to poll"""
+    if async_gemini_client is None:
+        return jsonify({"error": "Async generation is unavailable (aiohttp is not installed)"}), 501
+    user_id = current_user_id()
+    skill = user_store.get_skill(user_id, skill_id)
+    if not skill or step_index >= len(skill.get("steps", [])):
+        return jsonify({"error": "Invalid skill or step index"}), 404
+    step = skill["steps"][step_index]
+    # Already generated questions are returned straight away as a finished job
+    if step.get("mcqs", {}).get("questions"):
+        job = generation_jobs.create("mcqs", skill_id=skill_id, step_index=step_index)
+        generation_jobs.update(job["id"], status="done", result=step["mcqs"])
+        return job_accepted(generation_jobs.get(job["id"]))
+    try:
+        job = job_queue.submit_coroutine(
+            "mcqs", lambda: run_mcq_job_async(user_id, skill_id, step_index, step),
+            skill_id=skill_id, step_index=step_index
+        )
+    except QueueFullError:
+        return queue_full_response()
+    return job_accepted(job)
+
+@app.route('/async/jobs/<job_id>')
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = generation_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job.pop("params", None)
+    return jsonify(job)
+
 @app.route('/congratulations/<skill_id>')
 def congratulations(skill_id):
-    user_id = session.get('user_id', 'default')
-    user_data = load_user_data(user_id)
+    user_id = current_user_id()
+    with user_store.locked(user_id):
+        skill = user_store.get_skill(user_id, skill_id)
+        if not skill:
+            return render_template('error.html', error="Skill not found")
+        skill = copy.deepcopy(skill)
     
-    skill = next((s for s in user_data.get("skills", []) if s.get("skill_name") == skill_id), None)
-    if not skill:
-        return render_template('error.html', error="Skill not found")
-    
-    # Ensure skill is marked as 100% complete
-    skill["overall_progress"] = 100
-    for step in skill.get("steps", []):
-        step["status"] = "completed"
-        step["progress"] = 100
+        # Ensure skill is marked as 100% complete
+        skill["overall_progress"] = 100
+        for step in skill.get("steps", []):
+            step["status"] = "completed"
+            step["progress"] = 100
+        skill["step_counts"] = status_counts(skill.get("steps", []))
     
-    save_user_data(user_data, user_id)
+        user_store.save_skill(user_id, skill)
     
     return render_template('congratulations.html', skill=skill)
 
@@ -0,0 +1,181 @@
+"""Local stand-in for the Gemini generateContent API, for benchmarks.
+
+Replies are shaped by the request's responseSchema (plan, MCQs or batched
+MCQs), so the app parses them as it would real output. Latency, truncation
+and error rates are configurable.
+
+    python bench/fake_gemini.py --port 8081 --latency 0.8 --truncate-rate 0.05 --error-rate 0.02
+
+then start the app with GEMINI_BASE_URL=http://127.0.0.1:8081/v1beta/models
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_plan(topic, steps=8):
+    return {
+        "skill_name": topic.title(),
+        "description": f"A practical path to learning {topic}.",
+        "steps": [
+            {
+                "title": f"{topic.title()} step {i + 1}",
+                "explanation": f"Explanation of part {i + 1} of {topic}, in a sentence or two.",
+                "exercise": f"Practise part {i + 1} with a short exercise.",
+                "tip": "Take notes as you go.",
+                "sub_steps": [
+                    {
+                        "title": f"Sub-step {i + 1}.{j + 1}",
+                        "explanation": "A focused look at one idea.",
+                        "exercise": "Try it yourself.",
+                        "tip": "Keep it small."
+                    }
+                    for j in range(2)
+                ]
+            }
+            for i in range(steps)
+        ]
+    }
+
+
+def fake_questions(subject, count=3):
+    return [
+        {
+            "question": f"Question {n + 1} about {subject[:40]}?",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correctIndex": n % 4,
+            "explanation": "Because it is the best fit."
+        }
+        for n in range(count)
+    ]
+
+
+def fake_reply(payload):
+    """JSON text the model would have produced for this request"""
+    schema = payload.get("generationConfig", {}).get("responseSchema") or {}
+    properties = list(schema.get("properties", {}))
+    prompt = payload["contents"][0]["parts"][0]["text"]
+    if properties == ["questions"]:
+        return json.dumps({"questions": fake_questions(prompt)})
+    if properties == ["steps"]:
+        count = prompt.count("STEP ")
+        return json.dumps({"steps": [
+            {"step": n, "questions": fake_questions(f"step {n}")} for n in range(1, count + 1)
+        ]})
+    topic = prompt.split("Topic:", 1)[-1].strip() or "a skill"
+    return json.dumps(fake_plan(topic), indent=2)
+
+
+class FakeGemini:
+    def __init__(self, latency=0.5, jitter=0.25, truncate_rate=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.truncate_rate = truncate_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def roll(self):
+        with self._lock:
+            self.requests += 1
+            return (self.random.random(), self.random.random(),
+                    self.random.uniform(-self.jitter, self.jitter), self.random.choice([429, 500, 503]))
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Start serving on a daemon thread; returns the HTTP server (see server_port)"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                error_roll, truncate_roll, jitter, error_status = fake.roll()
+                time.sleep(max(0.0, fake.latency * (1 + jitter)))
+                if error_roll < fake.error_rate:
+                    self._send(error_status, {"error": {"message": "simulated failure"}})
+                    return
+                text = fake_reply(payload)
+                finish_reason = "STOP"
+                if truncate_roll < fake.truncate_rate:
+                    text = text[:int(len(text) * (0.3 + 0.6 * truncate_roll / fake.truncate_rate))]
+                    finish_reason = "MAX_TOKENS"
+                usage = {
+                    "promptTokenCount": len(json.dumps(payload)) // 4,
+                    "candidatesTokenCount": len(text) // 4,
+                    "totalTokenCount": (len(json.dumps(payload)) + len(text)) // 4
+                }
+                if ":streamGenerateContent" in self.path:
+                    self._stream(text, finish_reason, usage)
+                else:
+                    self._send(200, {
+                        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                                        "finishReason": finish_reason}],
+                        "usageMetadata": usage
+                    })
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, text, finish_reason, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                pieces = [text[i:i + 200] for i in range(0, len(text), 200)] or [""]
+                for number, piece in enumerate(pieces, start=1):
+                    candidate = {"content": {"parts": [{"text": piece}], "role": "model"}}
+                    if number == len(pieces):
+                        candidate["finishReason"] = finish_reason
+                    chunk = {"candidates": [candidate], "usageMetadata": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+        return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.5, help="mean Gemini response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency varies by +/- this fraction")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of replies cut off with MAX_TOKENS")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429/500/503")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def from_args(args):
+    return FakeGemini(args.latency, args.jitter, args.truncate_rate, args.error_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini API")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = from_args(args).serve(port=args.port)
+    print(f"Fake Gemini listening on http://127.0.0.1:{server.server_port}/v1beta/models")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Fuzz and benchmark json_repair.recover_json against the old parsing path.
+
+Every sample reply is cut off at every offset, the way a MAX_TOKENS truncation
+would leave it, and both parsers are asked to recover it. Recovered values must
+be a faithful prefix of the original document.
+
+    python bench/json_repair_fuzz.py [--rounds 200]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_repair import recover_json, JSONRecoveryError
+
+
+PLAN = {
+    "skill_name": "Python for Data Science",
+    "description": "Learn {pandas}, [numpy] and \"plotting\" from scratch.",
+    "steps": [
+        {
+            "title": f"Step {i}: Working with data",
+            "explanation": "Use df[\"col\"] to select a column.\nThen call .groupby() on it — see the docs\\examples.",
+            "exercise": "Load a CSV and print the first 5 rows: {\"rows\": 5}",
+            "tip": "Try `df.head()` first.",
+            "sub_steps": [
+                {"title": f"Sub-step {i}.{j}", "explanation": "Indexing with [] and .loc", "exercise": "e", "tip": "t"}
+                for j in range(2)
+            ],
+            "estimated_minutes": 30 + i,
+            "optional": i % 2 == 0,
+            "resources": None,
+        }
+        for i in range(6)
+    ],
+}
+
+MCQS = {
+    "questions": [
+        {"question": f"What does len([1, 2, {i}]) return?", "options": ["1", "2", "3", "Error"], "correctIndex": 2}
+        for i in range(5)
+    ]
+}
+
+
+def samples():
+    for name, doc in (("plan", PLAN), ("mcqs", MCQS)):
+        yield f"{name}/compact", json.dumps(doc)
+        yield f"{name}/fenced", "```json\n" + json.dumps(doc, indent=2) + "\n```"
+        yield f"{name}/prose", "Here is your plan:\n" + json.dumps(doc, indent=2, ensure_ascii=False) + "\nGood luck!"
+
+
+def legacy_parse(text_response, finish_reason="MAX_TOKENS"):
+    """The parsing path GeminiClient used before json_repair, kept for comparison"""
+    cleaned = text_response.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    cleaned = cleaned.strip()
+    if not cleaned:
+        raise ValueError("empty")
+    try:
+        if finish_reason == "MAX_TOKENS":
+            try:
+                json.loads(cleaned)
+            except json.JSONDecodeError:
+                if cleaned.count("{") > cleaned.count("}") or cleaned.count("[") > cleaned.count("]"):
+                    if cleaned.startswith("{"):
+                        cleaned += "]" * (cleaned.count("[") - cleaned.count("]"))
+                        cleaned += "}" * (cleaned.count("{") - cleaned.count("}"))
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        match = re.search(r'(\{.*\})', text_response, re.DOTALL)
+        if match:
+            return json.loads(match.group(1))
+        raise
+
+
+def is_prefix_of(recovered, original):
+    """True when recovered could be what original looked like partway through being written"""
+    if isinstance(recovered, dict):
+        if not isinstance(original, dict):
+            return False
+        keys = list(original)
+        if list(recovered) != keys[:len(recovered)]:
+            return False
+        # Only the last member may be partial
+        items = list(recovered.items())
+        for index, (key, value) in enumerate(items):
+            if index < len(items) - 1 and value != original[key]:
+                return False
+            if not is_prefix_of(value, original[key]):
+                return False
+        return True
+    if isinstance(recovered, list):
+        if not isinstance(original, list) or len(recovered) > len(original):
+            return False
+        for index, value in enumerate(recovered):
+            if index < len(recovered) - 1 and value != original[index]:
+                return False
+            if not is_prefix_of(value, original[index]):
+                return False
+        return True
+    if isinstance(recovered, str):
+        return isinstance(original, str) and original.startswith(recovered)
+    return recovered == original
+
+
+def fuzz():
+    totals = {"cuts": 0, "new_ok": 0, "legacy_ok": 0, "new_bad": 0}
+    failures = []
+    for name, text in samples():
+        original = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        first = text.index("{")
+        for cut in range(first + 1, len(text) + 1):
+            truncated = text[:cut]
+            totals["cuts"] += 1
+            try:
+                value, _ = recover_json(truncated)
+                if is_prefix_of(value, original):
+                    totals["new_ok"] += 1
+                else:
+                    totals["new_bad"] += 1
+                    failures.append((name, cut, "inconsistent"))
+            except JSONRecoveryError as e:
+                failures.append((name, cut, str(e)))
+            try:
+                if is_prefix_of(legacy_parse(truncated), original):
+                    totals["legacy_ok"] += 1
+            except ValueError:
+                pass
+    return totals, failures
+
+
+def timed(fn, texts, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - started) / (rounds * len(texts)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    totals, failures = fuzz()
+    cuts = totals["cuts"]
+    print(f"truncation offsets tried: {cuts}")
+    print(f"  recover_json recovered: {totals['new_ok']} ({totals['new_ok'] / cuts:.1%}), inconsistent: {totals['new_bad']}")
+    print(f"  legacy parser recovered: {totals['legacy_ok']} ({totals['legacy_ok'] / cuts:.1%})")
+    for name, cut, reason in failures[:10]:
+        print(f"  FAIL {name} @ {cut}: {reason}")
+
+    full = [text for _, text in samples()]
+    half = [text[:len(text) // 2] for text in full]
+    print("mean parse time per reply (us):")
+    print(f"  complete   recover_json {timed(recover_json, full, args.rounds):8.1f}   legacy {timed(legacy_parse, full, args.rounds):8.1f}")
+    legacy_safe = lambda text: _swallow(legacy_parse, text)
+    print(f"  truncated  recover_json {timed(recover_json, half, args.rounds):8.1f}   legacy {timed(legacy_safe, half, args.rounds):8.1f}")
+    return 1 if failures else 0
+
+
+def _swallow(fn, text):
+    try:
+        return fn(text)
+    except ValueError:
+        return None
+
+
+if __name__ == "__main__":
+    sys.exit(main())
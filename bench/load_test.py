@@ -0,0 +1,206 @@
+"""Drive realistic user flows against the app backed by a fake Gemini server.
+
+Starts bench/fake_gemini.py in-process and the Flask app in a subprocess
+(with a throwaway user data directory), then runs --users virtual users in
+parallel. Each user repeatedly generates a plan, opens its steps, marks them
+in progress and complete, and opens their quizzes. Latency percentiles and
+throughput are reported per route.
+
+    python bench/load_test.py --users 20 --duration 60 --latency 0.8 --truncate-rate 0.05
+    python bench/load_test.py --app-url http://127.0.0.1:5000   # an app you started yourself
+"""
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from urllib.parse import quote
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_gemini
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(gemini_url, data_dir, extra_env):
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_BASE_URL": gemini_url,
+        "GEMINI_API_KEY": "bench",
+        "USER_DATA_DIR": data_dir,
+        "USER_STORE_PATH": os.path.join(data_dir, "user_data.db"),
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env)
+    process = subprocess.Popen(
+        # Per-request access logs would drown out the report
+        [sys.executable, "-c", "import logging, app; logging.getLogger('werkzeug').setLevel(logging.WARNING); "
+                               f"app.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+        cwd=ROOT, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode}")
+        try:
+            requests.get(f"{url}/metrics", timeout=1)
+            return process, url
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start within 30 seconds")
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, ok))
+
+
+class VirtualUser:
+    def __init__(self, number, base_url, recorder, steps):
+        self.number = number
+        self.base_url = base_url
+        self.recorder = recorder
+        self.steps = steps
+        # One cookie jar per user, so each keeps its own session
+        self.session = requests.Session()
+
+    def call(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.exceptions.RequestException:
+            response, ok = None, False
+        self.recorder.record(route, time.perf_counter() - started, ok)
+        return response
+
+    def flow(self, iteration):
+        skill = f"bench skill {self.number}-{iteration}"
+        response = self.call("GET /generate-plan/<skill>", "GET", f"/generate-plan/{quote(skill)}", allow_redirects=False)
+        if response is None or response.status_code != 302:
+            # Generation failed (e.g. simulated Gemini errors); the error page was already timed
+            return
+        skill_path = response.headers["Location"]
+        skill_id = skill_path.rstrip("/").rsplit("/", 1)[-1]
+        self.call("GET /skill/<id>", "GET", skill_path)
+        for step_index in range(self.steps):
+            self.call("GET /step/<id>/<n>", "GET", f"/step/{skill_id}/{step_index}")
+            progress = {"skill_id": skill_id, "step_index": step_index, "status": "in_progress"}
+            self.call("POST /update-progress", "POST", "/update-progress", json=progress)
+            self.call("GET /get-mcqs/<id>/<n>", "GET", f"/get-mcqs/{skill_id}/{step_index}")
+            progress["status"] = "completed"
+            self.call("POST /update-progress", "POST", "/update-progress", json=progress)
+
+    def run(self, deadline, flows):
+        iteration = 0
+        while time.time() < deadline and (flows is None or iteration < flows):
+            self.flow(iteration)
+            iteration += 1
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    rows = []
+    for route, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        rows.append({
+            "route": route,
+            "requests": len(samples),
+            "errors": sum(1 for _, ok in samples if not ok),
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+        })
+    return rows
+
+
+def print_report(rows, elapsed, gemini_requests):
+    print(f"{'route':<28} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for row in rows:
+        print(f"{row['route']:<28} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['rps']:>8.2f}")
+    total = sum(row["requests"] for row in rows)
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s); fake Gemini served {gemini_requests} calls")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the app against a fake Gemini server")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to keep starting new flows")
+    parser.add_argument("--flows", type=int, default=None, help="stop each user after this many flows")
+    parser.add_argument("--steps", type=int, default=4, help="steps visited per generated plan")
+    parser.add_argument("--app-url", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the app, e.g. --env USER_STORE_BACKEND=sqlite")
+    parser.add_argument("--json", help="also write the results to this file")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = fake_gemini.from_args(args)
+    process = None
+    with tempfile.TemporaryDirectory(prefix="bench-user-data-") as data_dir:
+        if args.app_url:
+            base_url = args.app_url.rstrip("/")
+        else:
+            server = fake.serve()
+            gemini_url = f"http://127.0.0.1:{server.server_port}/v1beta/models"
+            # Every flow uses a fresh skill, so the response cache only matters for quizzes
+            extra_env = {"RESPONSE_CACHE_BACKEND": "none"}
+            extra_env.update(item.split("=", 1) for item in args.env)
+            process, base_url = start_app(gemini_url, data_dir, extra_env)
+
+        recorder = Recorder()
+        users = [VirtualUser(number, base_url, recorder, args.steps) for number in range(args.users)]
+        deadline = time.time() + args.duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=user.run, args=(deadline, args.flows)) for user in users]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+        elapsed = time.perf_counter() - started
+
+    rows = summarize(recorder, elapsed)
+    print_report(rows, elapsed, fake.requests)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"elapsed": elapsed, "users": args.users, "routes": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Micro-benchmarks for loading and saving one user's data at 10 KB to 10 MB.
+
+Times UserStore.load (behind load_user_data), UserStore.save and a single
+progress write, for the JSON store with and without its parsed-document
+cache and for the SQLite store.
+
+    python bench/storage_bench.py [--sizes 10k,100k,1m,10m] [--budget 2]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import JSONUserStore, SQLiteUserStore
+
+USER_ID = "bench"
+
+
+def parse_size(text):
+    units = {"k": 1024, "m": 1024 * 1024}
+    text = text.strip().lower()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def make_step(skill_number, step_number):
+    return {
+        "title": f"Step {step_number} of skill {skill_number}",
+        "explanation": "A sentence or two explaining this part of the skill. " * 2,
+        "exercise": "Practise it with a short exercise.",
+        "tip": "Take notes as you go.",
+        "progress": 0,
+        "status": "not_started",
+        "sub_steps": [
+            {"title": f"Sub-step {step_number}.{n}", "explanation": "One focused idea.",
+             "exercise": "Try it.", "tip": "Keep it small.", "status": "not_started"}
+            for n in range(2)
+        ],
+        "sub_step_counts": {"completed": 0, "in_progress": 0},
+        "mcqs": {"questions": [
+            {"question": f"Question {n}?", "options": ["A", "B", "C", "D"], "correctIndex": n % 4,
+             "explanation": "Because it is the best fit."}
+            for n in range(3)
+        ]},
+    }
+
+
+def make_user_data(target_bytes):
+    """A realistic user document of roughly target_bytes, grown ten steps per skill"""
+    step_bytes = len(json.dumps(make_step(0, 0)))
+    skills = []
+    total = 0
+    while total < target_bytes or not skills:
+        number = len(skills)
+        steps = [make_step(number, i) for i in range(10)]
+        skills.append({
+            "skill_id": f"skill-{number}",
+            "skill_name": f"Skill {number}",
+            "description": "A practical path to learning it.",
+            "steps": steps,
+            "overall_progress": 0,
+            "step_counts": {"completed": 0, "in_progress": 0},
+            "created_at": "2026-01-01 00:00:00",
+        })
+        total += step_bytes * 10
+    return {"skills": skills, "streaks": ["2026-01-01"], "last_active": "2026-01-01"}
+
+
+def measure(fn, budget):
+    """Run fn repeatedly for about `budget` seconds (at least 3 times); returns seconds per call"""
+    timings = []
+    deadline = time.perf_counter() + budget
+    while len(timings) < 3 or (time.perf_counter() < deadline and len(timings) < 1000):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def stores(directory):
+    yield "json (no cache)", JSONUserStore(os.path.join(directory, "json-cold"), cache_size=0)
+    yield "json (cached)", JSONUserStore(os.path.join(directory, "json-warm"), cache_size=16)
+    yield "sqlite", SQLiteUserStore(os.path.join(directory, "user_data.db"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user data load/save at several document sizes")
+    parser.add_argument("--sizes", default="10k,100k,1m,10m", help="comma-separated document sizes")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds spent on each measurement")
+    args = parser.parse_args()
+
+    print(f"{'backend':<16} {'size':>9} {'operation':<15} {'calls':>6} {'median ms':>10} {'p95 ms':>9}")
+    for size in [parse_size(s) for s in args.sizes.split(",")]:
+        data = make_user_data(size)
+        actual = len(json.dumps(data))
+        with tempfile.TemporaryDirectory(prefix="bench-storage-") as directory:
+            for name, store in stores(directory):
+                store.save(USER_ID, data)
+                skill_id = data["skills"][-1]["skill_id"]
+                operations = [
+                    ("load", lambda: store.load(USER_ID)),
+                    ("save", lambda: store.save(USER_ID, data)),
+                    ("progress write", lambda: store.write_progress(USER_ID, skill_id, 0, {"status": "in_progress"})),
+                ]
+                for operation, fn in operations:
+                    timings = sorted(measure(fn, args.budget))
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    print(f"{name:<16} {actual / 1024:>7.0f}KB {operation:<15} {len(timings):>6} "
+                          f"{statistics.median(timings) * 1000:>10.2f} {p95 * 1000:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import re
+import json
+
+
+class JSONRecoveryError(ValueError):
+    pass
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+_DELIMITERS = ",}]" + _WHITESPACE
+_STRING_SPECIAL = re.compile(r'["\\]')
+_decoder = json.JSONDecoder(strict=False)
+
+
+def recover_json(text):
+    """Pull the outermost JSON object out of an LLM reply in a single pass.
+
+    Code fences and prose around the object are ignored. If the reply was cut off,
+    the last partial element is dropped (a half-written string value is kept and
+    closed) and every open array and object is closed. Returns (value, repaired);
+    raises JSONRecoveryError when no object can be recovered.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise JSONRecoveryError("No JSON object found in response")
+
+    # Complete replies parse in one C-speed pass; trailing fences or prose are ignored
+    try:
+        return _decoder.raw_decode(text, start)[0], False
+    except json.JSONDecodeError:
+        pass
+
+    # Open containers, and per container what comes next: key, colon, value or comma
+    stack = []
+    expect = []
+    # Last position where cutting the text and closing stack[:depth] gives valid JSON
+    cut, cut_depth = start, 0
+    in_string = False
+    string_is_key = False
+    escaped = False
+    string_start = 0
+    scalar_start = -1
+
+    pos = start
+    end = len(text)
+    while pos < end:
+        ch = text[pos]
+
+        if scalar_start >= 0:
+            if ch not in _DELIMITERS:
+                pos += 1
+                continue
+            # A number or literal just ended
+            scalar_start = -1
+            expect[-1] = "comma"
+            cut, cut_depth = pos, len(stack)
+
+        if ch in _WHITESPACE:
+            pass
+        elif ch == "{" or ch == "[":
+            if stack and expect[-1] != "value":
+                raise JSONRecoveryError(f"Unexpected {ch!r} at offset {pos}")
+            stack.append(ch)
+            expect.append("key" if ch == "{" else "value")
+            cut, cut_depth = pos + 1, len(stack)
+        elif ch == "}" or ch == "]":
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                raise JSONRecoveryError(f"Unbalanced {ch!r} at offset {pos}")
+            stack.pop()
+            expect.pop()
+            if not stack:
+                return _loads(text[start:pos + 1]), False
+            expect[-1] = "comma"
+            cut, cut_depth = pos + 1, len(stack)
+        elif ch == '"':
+            string_is_key = expect[-1] == "key"
+            string_start = pos
+            # Jump straight to the closing quote, stepping over escapes
+            pos += 1
+            while True:
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    in_string = True
+                    pos = end
+                    break
+                pos = match.end()
+                if match.group() == '"':
+                    break
+                if pos >= end:
+                    in_string = escaped = True
+                    break
+                pos += 1
+            if in_string:
+                break
+            if string_is_key:
+                expect[-1] = "colon"
+            else:
+                expect[-1] = "comma"
+                cut, cut_depth = pos, len(stack)
+            continue
+        elif ch == ":":
+            expect[-1] = "value"
+        elif ch == ",":
+            expect[-1] = "key" if stack[-1] == "{" else "value"
+        else:
+            scalar_start = pos
+        pos += 1
+
+    # Truncated: keep a half-written string value, drop any other partial element
+    if in_string and not string_is_key:
+        partial = text[string_start:end]
+        if escaped:
+            partial = partial[:-1]
+        # A \uXXXX escape cut short cannot be closed
+        tail = partial[-6:]
+        marker = tail.rfind("\\u")
+        if marker >= 0 and len(tail) - marker < 6 and not _escaped_backslash(partial, len(partial) - len(tail) + marker):
+            partial = partial[:len(partial) - len(tail) + marker]
+        repaired = text[start:string_start] + partial + '"'
+        depth = len(stack)
+    else:
+        repaired = text[start:cut]
+        depth = cut_depth
+    repaired += "".join(_CLOSERS[opener] for opener in reversed(stack[:depth]))
+    return _loads(repaired), True
+
+
+def _escaped_backslash(text, index):
+    """True when the backslash at text[index] is itself escaped by an odd run before it"""
+    run = 0
+    while index > 0 and text[index - 1] == "\\":
+        run += 1
+        index -= 1
+    return run % 2 == 1
+
+
+def _loads(candidate):
+    try:
+        # strict=False accepts raw newlines inside strings, which models often emit
+        return json.loads(candidate, strict=False)
+    except json.JSONDecodeError as e:
+        raise JSONRecoveryError(str(e)) from e
@@ -0,0 +1,104 @@
+class PromptTemplate:
+    """System instructions, user message format and structured-output schema for one kind of Gemini call"""
+    def __init__(self, name, system, user_format="{prompt}", schema=None):
+        self.name = name
+        self.system = system
+        self.user_format = user_format
+        self.schema = schema
+
+    def render(self, prompt):
+        return self.user_format.format(prompt=prompt)
+
+    def generation_config(self):
+        # Structured output makes Gemini return bare JSON matching the schema, no fences or prose
+        if self.schema is None:
+            return {}
+        return {"responseMimeType": "application/json", "responseSchema": self.schema}
+
+
+def _string():
+    return {"type": "STRING"}
+
+
+def _object(properties, required=None):
+    # propertyOrdering keeps the plan header ahead of its steps so streaming can show it first
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": required if required is not None else list(properties),
+        "propertyOrdering": list(properties),
+    }
+
+
+_SUB_STEP_SCHEMA = _object({
+    "title": _string(),
+    "explanation": _string(),
+    "exercise": _string(),
+    "tip": _string(),
+})
+
+_STEP_SCHEMA = _object({
+    "title": _string(),
+    "explanation": _string(),
+    "exercise": _string(),
+    "tip": _string(),
+    "sub_steps": {"type": "ARRAY", "items": _SUB_STEP_SCHEMA},
+}, required=["title", "explanation", "exercise", "tip"])
+
+_QUESTION_SCHEMA = _object({
+    "question": _string(),
+    "options": {"type": "ARRAY", "items": _string(), "minItems": 4, "maxItems": 4},
+    "correctIndex": {"type": "INTEGER"},
+    "explanation": _string(),
+}, required=["question", "options", "correctIndex"])
+
+_QUESTIONS_SCHEMA = {"type": "ARRAY", "items": _QUESTION_SCHEMA}
+
+_MCQ_RULES = """Each question must have EXACTLY 4 options.
+        correctIndex is the index (0-3) of the correct option.
+        Give a brief explanation of why the answer is correct."""
+
+
+PROMPTS = {
+    "plan": PromptTemplate(
+        "plan",
+        system="""You are an educational AI assistant that writes step-by-step learning plans.
+        Keep your response concise to avoid truncation. Limit to 8-10 steps maximum.
+        Keep each explanation to 1-2 sentences and each exercise and tip brief.
+        Respond with a JSON object holding the skill_name, a brief description and the steps.""",
+        user_format="Topic: {prompt}",
+        schema=_object({
+            "skill_name": _string(),
+            "description": _string(),
+            "steps": {"type": "ARRAY", "items": _STEP_SCHEMA},
+        }),
+    ),
+    "mcq": PromptTemplate(
+        "mcq",
+        system=f"""You write multiple-choice questions that test understanding of key concepts in educational content.
+        Create 3 questions about the content you are given.
+        {_MCQ_RULES}""",
+        user_format="CONTENT:\n{prompt}",
+        schema=_object({"questions": _QUESTIONS_SCHEMA}),
+    ),
+    "mcq_batch": PromptTemplate(
+        "mcq_batch",
+        system=f"""You write multiple-choice questions that test understanding of key concepts in educational content.
+        You are given several numbered learning steps. For EACH step create 3 questions,
+        returning one entry per step, in order, with its step number.
+        {_MCQ_RULES}""",
+        schema=_object({
+            "steps": {"type": "ARRAY", "items": _object({
+                "step": {"type": "INTEGER"},
+                "questions": _QUESTIONS_SCHEMA,
+            })},
+        }),
+    ),
+}
+
+
+def get_prompt(task):
+    try:
+        return PROMPTS[task]
+    except KeyError:
+        raise ValueError(f"Unknown prompt task: {task}") from None
@@ -0,0 +1,60 @@
+// Status changes are queued and sent together to /update-progress/batch, once
+// no new change has arrived for PROGRESS_FLUSH_DELAY ms or before navigating away
+const PROGRESS_FLUSH_DELAY = 500;
+const PROGRESS_RETRY_DELAY = 5000;
+const pendingProgressUpdates = [];
+let progressFlushTimer = null;
+
+function queueProgressUpdate(update, onResult) {
+    pendingProgressUpdates.push({ update: update, onResult: onResult });
+    clearTimeout(progressFlushTimer);
+    progressFlushTimer = setTimeout(flushProgressUpdates, PROGRESS_FLUSH_DELAY);
+}
+
+// Resolves to one result per flushed update, in order; failed updates carry an `error`
+function flushProgressUpdates() {
+    clearTimeout(progressFlushTimer);
+    progressFlushTimer = null;
+    if (pendingProgressUpdates.length === 0) {
+        return Promise.resolve([]);
+    }
+    const batch = pendingProgressUpdates.splice(0);
+    return fetch('/update-progress/batch', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ updates: batch.map(item => item.update) }),
+    })
+    .then(
+        response => response.json()
+            .then(data => data.results || batch.map(() => ({ error: data.error || 'Progress update failed' })))
+            .catch(() => batch.map(() => ({ error: `Progress update failed (HTTP ${response.status})` }))),
+        error => {
+            // The request never reached the server (e.g. offline): keep the changes and try again later
+            pendingProgressUpdates.unshift(...batch);
+            if (progressFlushTimer === null) {
+                progressFlushTimer = setTimeout(flushProgressUpdates, PROGRESS_RETRY_DELAY);
+            }
+            return batch.map(() => ({ error: `Progress not saved yet: ${error.message}` }));
+        }
+    )
+    .then(results => {
+        batch.forEach((item, i) => {
+            if (item.onResult) {
+                item.onResult(results[i]);
+            }
+        });
+        return results;
+    });
+}
+
+// Don't lose queued changes when the user leaves before the timer fires
+window.addEventListener('pagehide', function() {
+    if (pendingProgressUpdates.length > 0) {
+        clearTimeout(progressFlushTimer);
+        const updates = pendingProgressUpdates.splice(0).map(item => item.update);
+        const body = JSON.stringify({ updates: updates });
+        navigator.sendBeacon('/update-progress/batch', new Blob([body], { type: 'application/json' }));
+    }
+});
@@ -57,17 +57,10 @@ function updateProgress(skillId, stepIndex, substepIndex, status) {
     }
 
     // Log the data being sent for debugging
-    console.log('Sending progress update:', data);
-
-    fetch('/update-progress', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(data)
-    })
-    .then(response => response.json())
-    .then(data => {
+    console.log('Queueing progress update:', data);
+
+    // Sent with any other clicks in the next moment as one /update-progress/batch request
+    queueProgressUpdate(data, data => {
         // Log the response for debugging
         console.log('Progress update response:', data);
         
@@ -118,9 +111,6 @@ function updateProgress(skillId, stepIndex, substepIndex, status) {
         } else if (status === 'in_progress') {
             showSuccessMessage('Progress updated! Keep going!');
         }
-    })
-    .catch(error => {
-        console.error('Error updating progress:', error);
     });
 }
 
@@ -181,6 +171,122 @@ if (skillSearchInput) {
     });
 }
 
+// Generate learning plans as background jobs and poll until they finish
+const learnForm = document.querySelector('.learn-form form');
+if (learnForm) {
+    learnForm.addEventListener('submit', function(event) {
+        event.preventDefault();
+        const skill = learnForm.querySelector('input[name="skill"]').value;
+        const submitButton = learnForm.querySelector('button[type="submit"]');
+        submitButton.disabled = true;
+        showGenerationStatus('Creating your learning plan...');
+
+        if (window.EventSource) {
+            streamPlan(skill, submitButton);
+        } else {
+            submitPlanJob(skill, submitButton);
+        }
+    });
+}
+
+// Show each step as soon as the server streams it, then open the saved plan
+function streamPlan(skill, submitButton) {
+    const source = new EventSource(`/stream-plan/${encodeURIComponent(skill)}`);
+    let receivedData = false;
+
+    source.addEventListener('plan', function(event) {
+        receivedData = true;
+        const plan = JSON.parse(event.data);
+        const preview = document.querySelector('.plan-preview');
+        preview.querySelector('.plan-preview-title').textContent = plan.skill_name || skill;
+        preview.querySelector('.plan-preview-description').textContent = plan.description || '';
+        preview.style.display = 'block';
+    });
+
+    source.addEventListener('step', function(event) {
+        receivedData = true;
+        const step = JSON.parse(event.data);
+        const item = document.createElement('li');
+        item.textContent = step.title;
+        document.querySelector('.plan-preview-steps').appendChild(item);
+        document.querySelector('.plan-preview').style.display = 'block';
+    });
+
+    source.addEventListener('done', function(event) {
+        source.close();
+        window.location.href = JSON.parse(event.data).redirect;
+    });
+
+    source.addEventListener('failed', function(event) {
+        source.close();
+        showGenerationStatus(`Plan generation failed: ${JSON.parse(event.data).error}`);
+        submitButton.disabled = false;
+    });
+
+    source.onerror = function() {
+        source.close();
+        // Streaming unavailable (e.g. a buffering proxy): fall back to the background job
+        if (!receivedData) {
+            submitPlanJob(skill, submitButton);
+        } else {
+            showGenerationStatus('Lost connection while creating the plan. Please try again.');
+            submitButton.disabled = false;
+        }
+    };
+}
+
+function submitPlanJob(skill, submitButton) {
+    const learnForm = document.querySelector('.learn-form form');
+    fetch('/jobs', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ type: 'plan', skill: skill })
+        })
+        .then(response => response.json().then(data => ({ status: response.status, data: data })))
+        .then(({ status, data }) => {
+            if (status === 202) {
+                pollJob(data.status_url, submitButton);
+            } else {
+                showGenerationStatus(data.error || 'Could not start generating the plan.');
+                submitButton.disabled = false;
+            }
+        })
+        .catch(error => {
+            console.error('Error starting plan generation:', error);
+            // Fall back to the classic blocking form submission
+            learnForm.submit();
+        });
+}
+
+function pollJob(statusUrl, submitButton) {
+    fetch(statusUrl)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'done') {
+                window.location.href = job.result.redirect;
+            } else if (job.status === 'failed') {
+                showGenerationStatus(`Plan generation failed: ${job.error}`);
+                submitButton.disabled = false;
+            } else {
+                setTimeout(() => pollJob(statusUrl, submitButton), 1000);
+            }
+        })
+        .catch(error => {
+            console.error('Error polling plan generation:', error);
+            setTimeout(() => pollJob(statusUrl, submitButton), 2000);
+        });
+}
+
+function showGenerationStatus(message) {
+    const statusEl = document.querySelector('.generation-status');
+    if (statusEl) {
+        statusEl.textContent = message;
+        statusEl.style.display = 'block';
+    }
+}
+
 // Update the current date in the UI
 function updateCurrentDate() {
     const dateElement = document.getElementById('current-date');
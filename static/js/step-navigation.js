@@ -80,33 +80,32 @@ function addNavigationButtons(skillId, currentStepIndex, navigationDiv) {
 }
 
 function updateStepStatus(skillId, stepIndex, substepIndex, status) {
-    fetch('/update-progress', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            skill_id: skillId,
-            step_index: stepIndex,
-            substep_index: substepIndex,
-            status: status
-        }),
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            fetch(`/check-step/${skillId}/${parseInt(stepIndex) + 1}`)
-                .then(response => response.json())
-                .then(nextStepData => {
-                    if (nextStepData.exists) {
-                        // If there's a next step, go to it
-                        window.location.href = `/step/${skillId}/${parseInt(stepIndex) + 1}`;
-                    } else {
-                        // If this is the last step, go to the congratulations page
-                        window.location.href = `/congratulations/${skillId}`;
-                    }
-                });
+    queueProgressUpdate({
+        skill_id: skillId,
+        step_index: stepIndex,
+        substep_index: substepIndex,
+        status: status
+    });
+    // About to navigate, so send everything queued now rather than on the timer
+    flushProgressUpdates()
+    .then(results => {
+        // This update was queued last, so its result is the last one
+        const result = results[results.length - 1];
+        if (!result || result.error) {
+            console.error('Error updating progress:', result ? result.error : 'no result');
+            return;
         }
+        fetch(`/check-step/${skillId}/${parseInt(stepIndex) + 1}`)
+            .then(response => response.json())
+            .then(nextStepData => {
+                if (nextStepData.exists) {
+                    // If there's a next step, go to it
+                    window.location.href = `/step/${skillId}/${parseInt(stepIndex) + 1}`;
+                } else {
+                    // If this is the last step, go to the congratulations page
+                    window.location.href = `/congratulations/${skillId}`;
+                }
+            });
     })
     .catch(error => {
         console.error('Error:', error);
@@ -0,0 +1,97 @@
+import os
+import gzip
+import hashlib
+import tempfile
+import threading
+from werkzeug.security import safe_join
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip variants are built
+    brotli = None
+
+
+# Text assets worth compressing; images and fonts are already compressed
+COMPRESSIBLE = (".css", ".js", ".svg", ".html", ".json", ".txt", ".map")
+
+# In order of preference: (Content-Encoding, file suffix, compress function)
+ENCODINGS = [
+    ("br", ".br", (lambda data: brotli.compress(data, quality=11)) if brotli is not None else None),
+    ("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+]
+
+
+class StaticAssets:
+    """Content hashes and precompressed (.br/.gz) variants of the files under a static folder.
+
+    Variants sit next to their source file and are rebuilt whenever the source
+    is newer, so editing an asset never serves a stale compressed copy.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._hashes = {}  # filename -> (mtime_ns, size, digest)
+        self._lock = threading.Lock()
+
+    def path(self, filename):
+        path = safe_join(self.root, filename)
+        return path if path is not None and os.path.isfile(path) else None
+
+    def version(self, filename):
+        """Short content hash of a static file for cache-busting URLs, or None if it does not exist"""
+        path = self.path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        cached = self._hashes.get(filename)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        self._hashes[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def variants(self, filename):
+        """(encoding, variant filename) pairs available for a static file, best first"""
+        path = self.path(filename)
+        if path is None or not filename.endswith(COMPRESSIBLE):
+            return []
+        available = []
+        for encoding, suffix, compress in ENCODINGS:
+            if compress is not None and self._build(path, path + suffix, compress):
+                available.append((encoding, filename + suffix))
+        return available
+
+    def _build(self, source, target, compress):
+        try:
+            if os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns:
+                return True
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            with open(source, "rb") as f:
+                data = compress(f.read())
+            # Atomic replace, so a concurrent request never reads a half-written variant
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                # mkstemp creates 0600 files; match the source so a front-end server can read the variant
+                os.chmod(tmp_path, os.stat(source).st_mode & 0o777)
+                os.replace(tmp_path, target)
+            except OSError:
+                # e.g. a read-only static folder; serve the uncompressed file instead
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+        return True
+
+    def compress_all(self):
+        """Build every missing or stale variant; returns the number of source files covered"""
+        count = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                filename = os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+                if self.variants(filename):
+                    count += 1
+        return count
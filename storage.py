@@ -0,0 +1,886 @@
+import os
+import re
+import copy
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import atexit
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = metrics.counter(
+    "user_store_cache_lookups_total", "Parsed user documents served from the JSON store cache", ["result"])
+FILE_BYTES = metrics.counter(
+    "user_store_file_bytes_total", "Bytes of user JSON read from or written to disk", ["op"])
+IO_SECONDS = metrics.histogram(
+    "user_store_io_seconds", "Time spent reading or writing the user data backend", ["backend", "op"])
+
+
+def timed(op):
+    """Record the wrapped store method's duration under user_store_io_seconds"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with IO_SECONDS.time(backend=self.backend_name, op=op):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class UserDataTooLarge(Exception):
+    """A save would grow a user's data past the store's per-user size cap"""
+
+
+def empty_user_data():
+    return {"skills": [], "streaks": [], "last_active": None}
+
+
+def shard_dir(root, user_id, depth=2):
+    """Hash-prefix subdirectory for a user's files, e.g. root/3f/a9, so no directory grows large"""
+    digest = hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()
+    return os.path.join(root, *(digest[2 * level:2 * level + 2] for level in range(depth)))
+
+
+def compact_mcqs(user_data, max_bytes=None):
+    """Drop stored quiz questions, which can be regenerated when a quiz is reopened.
+
+    Without max_bytes only completed steps lose theirs. With it, sets are
+    dropped until the document serializes to at most max_bytes: completed
+    steps first, then the oldest skills' steps. Returns the number dropped.
+    """
+    candidates = []
+    for position, skill in enumerate(user_data.get("skills", [])):
+        for index, step in enumerate(skill.get("steps", [])):
+            if step.get("mcqs"):
+                candidates.append((step.get("status") != "completed", position, index, step))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    size = len(json.dumps(user_data)) if max_bytes else None
+    dropped = 0
+    for not_completed, _, _, step in candidates:
+        if max_bytes is None and not_completed:
+            break
+        if max_bytes is not None and size <= max_bytes:
+            break
+        if size is not None:
+            # The member's text plus its separator and key
+            size -= len(json.dumps(step["mcqs"])) + len('"mcqs": , ')
+        del step["mcqs"]
+        dropped += 1
+    return dropped
+
+
+def slugify(name):
+    """URL-safe id for a skill name, e.g. "Python for Data Science" becomes python-for-data-science"""
+    slug = re.sub(r"[^a-z0-9]+", "-", str(name or "").lower()).strip("-")
+    return slug or "skill"
+
+
+def skill_key(skill):
+    """Stable id of a stored skill; skills saved before ids existed fall back to their slug"""
+    return skill.get("skill_id") or slugify(skill.get("skill_name"))
+
+
+def touch_skill(skill, previous_version=None):
+    """Bump a skill's version (from previous_version, else its own) and stamp updated_at; views derive ETags from these"""
+    base = skill.get("version") if previous_version is None else previous_version
+    skill["version"] = (base or 0) + 1
+    skill["updated_at"] = int(time.time())
+
+
+def build_skill_index(user_data):
+    """Map each skill's id and name to its position in user_data["skills"]"""
+    by_id, by_name = {}, {}
+    for position, skill in enumerate(user_data.get("skills", [])):
+        by_id.setdefault(skill_key(skill), position)
+        by_name.setdefault(skill.get("skill_name"), position)
+    return {"by_id": by_id, "by_name": by_name}
+
+
+def unique_skill_id(skill_name, taken):
+    """Slug for skill_name that does not clash with any id in `taken`"""
+    base = slugify(skill_name)
+    skill_id, n = base, 2
+    while skill_id in taken:
+        skill_id, n = f"{base}-{n}", n + 1
+    return skill_id
+
+
+class UserLocks:
+    """Re-entrant per-user locks that exclude other threads (RLock) and other processes (fcntl.flock).
+
+    Nothing is kept for users nobody holds: the in-process entry is dropped
+    once no thread holds or waits for it, and the lock file is unlinked on release.
+    """
+
+    def __init__(self, lock_dir, shard_depth=2):
+        self.lock_dir = lock_dir
+        self.shard_depth = shard_depth
+        os.makedirs(lock_dir, exist_ok=True)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def path(self, user_id):
+        return os.path.join(shard_dir(self.lock_dir, user_id, self.shard_depth), f"{user_id}.lock")
+
+    def _open(self, user_id):
+        path = self.path(user_id)
+        try:
+            return open(path, "a")
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return open(path, "a")
+
+    def _acquire_file(self, user_id):
+        path = self.path(user_id)
+        while True:
+            f = self._open(user_id)
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # The previous holder may have unlinked the file while we waited; lock the current one instead
+            try:
+                if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _release_file(self, user_id, f):
+        # Unlink while still holding the lock, so lock files don't pile up for every user ever seen
+        try:
+            os.unlink(self.path(user_id))
+        except FileNotFoundError:
+            pass
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    @contextmanager
+    def hold(self, user_id):
+        with self._guard:
+            if user_id not in self._locks:
+                self._locks[user_id] = (threading.RLock(), {"depth": 0, "file": None, "users": 0})
+            rlock, state = self._locks[user_id]
+            # Threads holding or waiting for this entry; it is dropped when the last one leaves
+            state["users"] += 1
+        try:
+            with rlock:
+                # Only the outermost hold in this thread takes the file lock
+                if state["depth"] == 0 and fcntl is not None:
+                    state["file"] = self._acquire_file(user_id)
+                state["depth"] += 1
+                try:
+                    yield
+                finally:
+                    state["depth"] -= 1
+                    if state["depth"] == 0 and state["file"] is not None:
+                        self._release_file(user_id, state["file"])
+                        state["file"] = None
+        finally:
+            with self._guard:
+                state["users"] -= 1
+                if state["users"] == 0:
+                    del self._locks[user_id]
+
+
+class UserStore:
+    """Storage backend for per-user learning data.
+
+    Subclasses must implement load() and save() and set `self.locks`. The
+    finer-grained methods default to a locked load/modify/save of the whole
+    document; backends that can do better (such as SQLiteUserStore)
+    override them.
+
+    Documents returned by load() and get_skill() may be shared with an
+    in-process cache, so callers must copy them before modifying.
+    """
+
+    # Per-user cap on the stored document in bytes; None disables it
+    max_bytes = None
+
+    def load(self, user_id):
+        raise NotImplementedError
+
+    def save(self, user_id, data):
+        raise NotImplementedError
+
+    def user_ids(self):
+        raise NotImplementedError
+
+    def locked(self, user_id):
+        """Hold the user's lock so a read-modify-write sequence cannot interleave with other writers"""
+        return self.locks.hold(user_id)
+
+    @contextmanager
+    def transaction(self, user_id):
+        """Yield the user's document under their lock and save it if the block finishes cleanly"""
+        with self.locked(user_id):
+            user_data = self._load_for_update(user_id)
+            yield user_data
+            self.save(user_id, user_data)
+
+    def _load_for_update(self, user_id):
+        """Return a private copy of the document that the caller may modify"""
+        return self.load(user_id)
+
+    def _skill_index(self, user_id, user_data):
+        return build_skill_index(user_data)
+
+    @staticmethod
+    def _find(user_data, index, skill_ref):
+        """Look a skill up by id, falling back to its name for links made before ids existed"""
+        position = index["by_id"].get(skill_ref)
+        if position is None:
+            position = index["by_name"].get(skill_ref)
+        return user_data["skills"][position] if position is not None else None
+
+    def get_skill(self, user_id, skill_ref):
+        """Return the skill whose id (or, failing that, name) is skill_ref"""
+        user_data = self.load(user_id)
+        return self._find(user_data, self._skill_index(user_id, user_data), skill_ref)
+
+    def save_skill(self, user_id, skill):
+        """Upsert a skill by skill_name, giving new skills a unique skill_id; returns the skill_id"""
+        with self.transaction(user_id) as user_data:
+            skills = user_data.setdefault("skills", [])
+            index = build_skill_index(user_data)
+            position = index["by_name"].get(skill.get("skill_name"))
+            if position is not None:
+                skill["skill_id"] = skill_key(skills[position])
+                touch_skill(skill, skills[position].get("version"))
+                skills[position] = skill
+            else:
+                skill.setdefault("skill_id", unique_skill_id(skill.get("skill_name"), index["by_id"]))
+                touch_skill(skill)
+                skills.append(skill)
+        return skill["skill_id"]
+
+    def write_progress(self, user_id, skill_ref, step_index, step_fields,
+                       sub_index=None, sub_fields=None, skill_fields=None):
+        """Apply one progress change to a step, optionally one of its sub-steps and the skill"""
+        return self.write_progress_many(
+            user_id, skill_ref, {step_index: step_fields},
+            sub_fields={(step_index, sub_index): sub_fields} if sub_index is not None and sub_fields else None,
+            skill_fields=skill_fields
+        )
+
+    def write_progress_many(self, user_id, skill_ref, step_fields, sub_fields=None, skill_fields=None):
+        """Apply field changes to several steps ({step_index: fields}) and sub-steps
+        ({(step_index, sub_index): fields}) of one skill in a single write"""
+        with self.transaction(user_id) as user_data:
+            skill = self._find(user_data, build_skill_index(user_data), skill_ref)
+            steps = skill.get("steps", []) if skill else []
+            if not skill or any(step_index >= len(steps) for step_index in step_fields):
+                return False
+            for step_index, fields in step_fields.items():
+                steps[step_index].update(fields)
+            for (step_index, sub_index), fields in (sub_fields or {}).items():
+                steps[step_index]["sub_steps"][sub_index].update(fields)
+            if skill_fields:
+                skill.update(skill_fields)
+            touch_skill(skill)
+        return True
+
+    def set_step_mcqs(self, user_id, skill_ref, step_index, mcqs):
+        return self.write_progress(user_id, skill_ref, step_index, {"mcqs": mcqs})
+
+    def set_mcqs_many(self, user_id, skill_ref, mcqs_by_step):
+        """Store questions for several steps ({step_index: mcqs}) in a single write"""
+        return self.write_progress_many(
+            user_id, skill_ref, {step_index: {"mcqs": mcqs} for step_index, mcqs in mcqs_by_step.items()}
+        )
+
+    def get_activity(self, user_id):
+        """Return (streaks, last_active) for the user"""
+        user_data = self.load(user_id)
+        return list(user_data.get("streaks", [])), user_data.get("last_active")
+
+    def set_activity(self, user_id, streaks, last_active):
+        with self.transaction(user_id) as user_data:
+            user_data["streaks"] = streaks
+            user_data["last_active"] = last_active
+
+    def compact(self, user_id):
+        """Drop quiz questions stored on completed steps; returns how many sets were removed"""
+        with self.transaction(user_id) as user_data:
+            return compact_mcqs(user_data)
+
+
+class JSONUserStore(UserStore):
+    """One JSON document per user under `data_dir`, replaced atomically on every save.
+
+    Files are spread over `shard_depth` levels of hash-prefix subdirectories
+    (256 per level) so lookups stay fast with many users; files from the old
+    flat layout are moved into place on startup. With `max_bytes` set, a save
+    that would exceed it first drops stored quiz questions (see compact_mcqs)
+    and then raises UserDataTooLarge.
+
+    Parsed documents are cached per process (up to `cache_size` users) and
+    revalidated against the file's stat on every load, so writes from other
+    workers are picked up. With `write_behind` set to a number of seconds,
+    saves only update the cache and a background thread flushes them to
+    disk on that interval and at exit; only use it with a single process.
+    """
+
+    backend_name = "json"
+
+    def __init__(self, data_dir, cache_size=1024, write_behind=0, shard_depth=2, max_bytes=None):
+        self.data_dir = data_dir
+        self.shard_depth = shard_depth
+        self.max_bytes = max_bytes
+        os.makedirs(data_dir, exist_ok=True)
+        self.locks = UserLocks(os.path.join(data_dir, ".locks"), shard_depth)
+        self._adopt_flat_files()
+        self.cache_size = cache_size
+        self.write_behind = write_behind
+        self._cache = OrderedDict()
+        self._dirty = set()
+        self._cache_lock = threading.Lock()
+        if write_behind:
+            self._stop_flushing = threading.Event()
+            threading.Thread(target=self._flush_loop, name="user-data-flusher", daemon=True).start()
+            atexit.register(self.close)
+
+    def path(self, user_id):
+        return os.path.join(shard_dir(self.data_dir, user_id, self.shard_depth), f"{user_id}_data.json")
+
+    def user_ids(self):
+        user_ids = []
+        for directory, subdirectories, names in os.walk(self.data_dir):
+            subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+            user_ids.extend(name[:-len("_data.json")] for name in sorted(names) if name.endswith("_data.json"))
+        return user_ids
+
+    def _adopt_flat_files(self):
+        """Move documents saved directly in data_dir, before sharding, into their subdirectory"""
+        for name in os.listdir(self.data_dir):
+            if not name.endswith("_data.json"):
+                continue
+            user_id = name[:-len("_data.json")]
+            target = self.path(user_id)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.replace(os.path.join(self.data_dir, name), target)
+            except FileNotFoundError:
+                pass  # another worker moved it first
+
+    @staticmethod
+    def _stamp(stat):
+        # Every save renames a new file into place, so the inode changes even within one mtime tick
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _remember(self, user_id, stamp, data):
+        if not self.cache_size and not self.write_behind:
+            return
+        with self._cache_lock:
+            self._cache[user_id] = [stamp, data, None]
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                oldest = next((u for u in self._cache if u not in self._dirty), None)
+                if oldest is None:
+                    break
+                del self._cache[oldest]
+
+    def load(self, user_id):
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and user_id in self._dirty:
+                CACHE_LOOKUPS.inc(result="hit")
+                return entry[1]
+        try:
+            stamp = self._stamp(os.stat(self.path(user_id)))
+        except FileNotFoundError:
+            return empty_user_data()
+        if entry is not None and entry[0] == stamp:
+            with self._cache_lock:
+                if user_id in self._cache:
+                    self._cache.move_to_end(user_id)
+            CACHE_LOOKUPS.inc(result="hit")
+            return entry[1]
+        CACHE_LOOKUPS.inc(result="miss")
+        return self._read(user_id)
+
+    def _skill_index(self, user_id, user_data):
+        # The index is built once per cached document and dropped with it
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[1] is user_data:
+                if entry[2] is None:
+                    entry[2] = build_skill_index(user_data)
+                return entry[2]
+        return build_skill_index(user_data)
+
+    def _load_for_update(self, user_id):
+        # Pending write-behind changes are newer than the file; otherwise parse a private copy
+        with self._cache_lock:
+            if user_id in self._dirty:
+                return copy.deepcopy(self._cache[user_id][1])
+        return self._read(user_id, remember=False)
+
+    @timed("read")
+    def _read(self, user_id, remember=True):
+        # Saves replace the file atomically, so readers never see a partial document and need no lock
+        file_path = self.path(user_id)
+        try:
+            with open(file_path, 'r') as f:
+                stamp = self._stamp(os.fstat(f.fileno()))
+                data = json.load(f)
+            FILE_BYTES.inc(stamp[2], op="read")
+        except FileNotFoundError:
+            return empty_user_data()
+        except json.JSONDecodeError as e:
+            self._move_aside(user_id, stamp, e)
+            # Either it was moved aside (the re-read finds no file) or a writer replaced it meanwhile
+            return self._read(user_id, remember)
+        if remember:
+            self._remember(user_id, stamp, data)
+        return data
+
+    def _move_aside(self, user_id, stamp, error):
+        """Keep an unreadable file for recovery instead of letting the next save overwrite it"""
+        file_path = self.path(user_id)
+        with self.locked(user_id):
+            # Only the file that failed to parse: another reader may have moved it already,
+            # or a writer may have renamed a valid document into place since
+            try:
+                if self._stamp(os.stat(file_path)) != stamp:
+                    return
+            except FileNotFoundError:
+                return
+            backup_path = base = f"{file_path}.corrupt-{int(time.time())}"
+            n = 2
+            while os.path.exists(backup_path):
+                backup_path, n = f"{base}-{n}", n + 1
+            os.replace(file_path, backup_path)
+        logger.warning("%s is not valid JSON (%s); moved it to %s", file_path, error, backup_path)
+
+    def save(self, user_id, data):
+        if self.write_behind:
+            if self.max_bytes:
+                # Fail the request now rather than the background flush later
+                self._serialize(user_id, data)
+            with self._cache_lock:
+                self._dirty.add(user_id)
+            self._remember(user_id, None, data)
+            return
+        self._remember(user_id, self._write(user_id, data), data)
+
+    @timed("serialize")
+    def _serialize(self, user_id, data):
+        payload = json.dumps(data)
+        if self.max_bytes and len(payload) > self.max_bytes:
+            if compact_mcqs(data, self.max_bytes):
+                payload = json.dumps(data)
+            if len(payload) > self.max_bytes:
+                raise UserDataTooLarge(f"Data for {user_id} would be {len(payload)} bytes; the limit is {self.max_bytes}")
+        return payload
+
+    @timed("write")
+    def _write(self, user_id, data):
+        """Write the document to a temp file and rename it over the old one; returns the new stamp"""
+        payload = self._serialize(user_id, data)
+        directory = os.path.dirname(self.path(user_id))
+        with self.locked(user_id):
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{user_id}_", suffix=".tmp")
+            except FileNotFoundError:
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{user_id}_", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    stamp = self._stamp(os.fstat(f.fileno()))
+                os.replace(tmp_path, self.path(user_id))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        FILE_BYTES.inc(stamp[2], op="write")
+        return stamp
+
+    def flush(self):
+        """Write every pending write-behind document to disk"""
+        with self._cache_lock:
+            dirty = list(self._dirty)
+        for user_id in dirty:
+            with self.locked(user_id):
+                with self._cache_lock:
+                    if user_id not in self._dirty:
+                        continue
+                    data = self._cache[user_id][1]
+                stamp = self._write(user_id, data)
+                with self._cache_lock:
+                    # A save that landed during the write stays dirty for the next flush
+                    entry = self._cache.get(user_id)
+                    if entry is not None and entry[1] is data:
+                        entry[0] = stamp
+                        self._dirty.discard(user_id)
+
+    def _flush_loop(self):
+        while not self._stop_flushing.wait(self.write_behind):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing user data")
+
+    def close(self):
+        if self.write_behind:
+            self._stop_flushing.set()
+        self.flush()
+
+
+class SQLiteUserStore(UserStore):
+    """Normalised SQLite storage so a single progress change is a single-row write.
+
+    `max_bytes` caps the JSON stored per user across all tables; writes over it
+    drop quiz questions like compact_mcqs and otherwise roll back with
+    UserDataTooLarge.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        last_active TEXT
+    );
+    CREATE TABLE IF NOT EXISTS streaks (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        PRIMARY KEY (user_id, day)
+    );
+    CREATE TABLE IF NOT EXISTS skills (
+        user_id TEXT NOT NULL,
+        skill_name TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        overall_progress INTEGER,
+        data TEXT NOT NULL,
+        skill_id TEXT,
+        PRIMARY KEY (user_id, skill_name)
+    );
+    CREATE INDEX IF NOT EXISTS idx_skills_user_position ON skills(user_id, position);
+    CREATE TABLE IF NOT EXISTS steps (
+        user_id TEXT NOT NULL,
+        skill_name TEXT NOT NULL,
+        step_index INTEGER NOT NULL,
+        status TEXT,
+        progress INTEGER,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, skill_name, step_index)
+    );
+    CREATE TABLE IF NOT EXISTS sub_steps (
+        user_id TEXT NOT NULL,
+        skill_name TEXT NOT NULL,
+        step_index INTEGER NOT NULL,
+        sub_index INTEGER NOT NULL,
+        status TEXT,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, skill_name, step_index, sub_index)
+    );
+    CREATE TABLE IF NOT EXISTS mcqs (
+        user_id TEXT NOT NULL,
+        skill_name TEXT NOT NULL,
+        step_index INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (user_id, skill_name, step_index)
+    );
+    """
+
+    # Fields kept in their own columns; everything else lives in the row's JSON `data`
+    SKILL_COLUMNS = ("overall_progress",)
+    STEP_COLUMNS = ("status", "progress")
+    SUB_STEP_COLUMNS = ("status",)
+
+    backend_name = "sqlite"
+
+    def __init__(self, path, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self.locks = UserLocks(os.path.join(os.path.dirname(os.path.abspath(path)), ".locks"))
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            self._upgrade_schema(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_skills_user_id ON skills(user_id, skill_id)")
+
+    def _upgrade_schema(self, conn):
+        """Add and backfill skill_id on databases created before skills had ids"""
+        columns = [row["name"] for row in conn.execute("PRAGMA table_info(skills)")]
+        if "skill_id" in columns:
+            return
+        conn.execute("ALTER TABLE skills ADD COLUMN skill_id TEXT")
+        taken = {}
+        for row in conn.execute("SELECT user_id, skill_name, data FROM skills ORDER BY user_id, position").fetchall():
+            user_ids = taken.setdefault(row["user_id"], set())
+            skill_id = json.loads(row["data"]).get("skill_id") or unique_skill_id(row["skill_name"], user_ids)
+            user_ids.add(skill_id)
+            conn.execute("UPDATE skills SET skill_id = ? WHERE user_id = ? AND skill_name = ?",
+                         (skill_id, row["user_id"], row["skill_name"]))
+
+    def _connect(self):
+        # sqlite3 connections are not shareable across threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _split(record, columns, nested=()):
+        data = {k: v for k, v in record.items() if k not in columns and k not in nested}
+        return [record.get(c) for c in columns], json.dumps(data)
+
+    @staticmethod
+    def _merge(row, columns):
+        record = json.loads(row["data"])
+        for column in columns:
+            if row[column] is not None:
+                record[column] = row[column]
+        return record
+
+    # Reading
+
+    def _read_skills(self, conn, user_id, skill_name=None):
+        where, params = "user_id = ?", [user_id]
+        if skill_name is not None:
+            where += " AND skill_name = ?"
+            params.append(skill_name)
+        skills = {}
+        for row in conn.execute(f"SELECT * FROM skills WHERE {where} ORDER BY position", params):
+            skill = self._merge(row, self.SKILL_COLUMNS)
+            skill["skill_name"] = row["skill_name"]
+            skill["skill_id"] = row["skill_id"]
+            skill["steps"] = []
+            skills[row["skill_name"]] = skill
+        if not skills:
+            return []
+        for row in conn.execute(f"SELECT * FROM steps WHERE {where} ORDER BY skill_name, step_index", params):
+            step = self._merge(row, self.STEP_COLUMNS)
+            step["sub_steps"] = []
+            skills[row["skill_name"]]["steps"].append(step)
+        for row in conn.execute(
+                f"SELECT * FROM sub_steps WHERE {where} ORDER BY skill_name, step_index, sub_index", params):
+            skills[row["skill_name"]]["steps"][row["step_index"]]["sub_steps"].append(
+                self._merge(row, self.SUB_STEP_COLUMNS))
+        for row in conn.execute(f"SELECT * FROM mcqs WHERE {where}", params):
+            skills[row["skill_name"]]["steps"][row["step_index"]]["mcqs"] = json.loads(row["data"])
+        return list(skills.values())
+
+    def user_ids(self):
+        rows = self._connect().execute("SELECT user_id FROM users UNION SELECT user_id FROM skills ORDER BY user_id")
+        return [row["user_id"] for row in rows]
+
+    @timed("read")
+    def load(self, user_id):
+        conn = self._connect()
+        user_data = empty_user_data()
+        user_data["skills"] = self._read_skills(conn, user_id)
+        user_data["streaks"], user_data["last_active"] = self.get_activity(user_id)
+        return user_data
+
+    def _resolve(self, conn, user_id, skill_ref):
+        """skill_name of the skill whose id (or, failing that, name) is skill_ref; one indexed lookup"""
+        row = conn.execute(
+            "SELECT skill_name FROM skills WHERE user_id = ? AND skill_id = ? ORDER BY position LIMIT 1",
+            (user_id, skill_ref)).fetchone()
+        if row is None:
+            row = conn.execute("SELECT skill_name FROM skills WHERE user_id = ? AND skill_name = ?",
+                               (user_id, skill_ref)).fetchone()
+        return row["skill_name"] if row else None
+
+    @timed("read")
+    def get_skill(self, user_id, skill_ref):
+        conn = self._connect()
+        skill_name = self._resolve(conn, user_id, skill_ref)
+        if skill_name is None:
+            return None
+        skills = self._read_skills(conn, user_id, skill_name)
+        return skills[0] if skills else None
+
+    @timed("read")
+    def get_activity(self, user_id):
+        conn = self._connect()
+        streaks = [row["day"] for row in conn.execute(
+            "SELECT day FROM streaks WHERE user_id = ? ORDER BY day", (user_id,))]
+        row = conn.execute("SELECT last_active FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return streaks, row["last_active"] if row else None
+
+    # Writing
+
+    def _write_skill(self, conn, user_id, skill, position):
+        skill_name = skill.get("skill_name")
+        for table in ("skills", "steps", "sub_steps", "mcqs"):
+            conn.execute(f"DELETE FROM {table} WHERE user_id = ? AND skill_name = ?", (user_id, skill_name))
+        columns, data = self._split(skill, self.SKILL_COLUMNS, nested=("skill_name", "skill_id", "steps"))
+        conn.execute(
+            "INSERT INTO skills (user_id, skill_name, position, overall_progress, data, skill_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [user_id, skill_name, position, *columns, data, skill_key(skill)]
+        )
+        for step_index, step in enumerate(skill.get("steps") or []):
+            columns, data = self._split(step, self.STEP_COLUMNS, nested=("sub_steps", "mcqs"))
+            conn.execute("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?)",
+                         [user_id, skill_name, step_index, *columns, data])
+            for sub_index, sub_step in enumerate(step.get("sub_steps") or []):
+                columns, data = self._split(sub_step, self.SUB_STEP_COLUMNS)
+                conn.execute("INSERT INTO sub_steps VALUES (?, ?, ?, ?, ?, ?)",
+                             [user_id, skill_name, step_index, sub_index, *columns, data])
+            if "mcqs" in step:
+                conn.execute("INSERT INTO mcqs VALUES (?, ?, ?, ?)",
+                             (user_id, skill_name, step_index, json.dumps(step["mcqs"])))
+
+    @timed("write")
+    def save(self, user_id, data):
+        with self._connect() as conn:
+            for table in ("skills", "steps", "sub_steps", "mcqs", "streaks", "users"):
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            for position, skill in enumerate(data.get("skills", [])):
+                self._write_skill(conn, user_id, skill, position)
+            self._write_activity(conn, user_id, data.get("streaks", []), data.get("last_active"))
+            self._enforce_cap(conn, user_id)
+
+    @timed("write")
+    def save_skill(self, user_id, skill):
+        # The position and id lookups run before sqlite3's implicit BEGIN, so two new plans
+        # saved at once could otherwise both take the same position and slug
+        with self.locked(user_id), self._connect() as conn:
+            row = conn.execute("SELECT position, skill_id, json_extract(data, '$.version') AS version "
+                               "FROM skills WHERE user_id = ? AND skill_name = ?",
+                               (user_id, skill.get("skill_name"))).fetchone()
+            if row is not None:
+                position = row["position"]
+                skill["skill_id"] = row["skill_id"]
+                touch_skill(skill, row["version"])
+            else:
+                touch_skill(skill)
+                position = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM skills WHERE user_id = ?",
+                                        (user_id,)).fetchone()[0]
+                if "skill_id" not in skill:
+                    taken = {r["skill_id"] for r in conn.execute(
+                        "SELECT skill_id FROM skills WHERE user_id = ?", (user_id,))}
+                    skill["skill_id"] = unique_skill_id(skill.get("skill_name"), taken)
+            self._write_skill(conn, user_id, skill, position)
+            self._enforce_cap(conn, user_id)
+        return skill["skill_id"]
+
+    def _update_row(self, conn, table, columns, keys, fields):
+        """Update one row: column fields in place, any other fields merged into its JSON data"""
+        where = " AND ".join(f"{k} = ?" for k in keys)
+        column_fields = {k: v for k, v in fields.items() if k in columns}
+        data_fields = {k: v for k, v in fields.items() if k not in columns}
+        if data_fields:
+            row = conn.execute(f"SELECT data FROM {table} WHERE {where}", list(keys.values())).fetchone()
+            if row is None:
+                return False
+            data = json.loads(row["data"])
+            data.update(data_fields)
+            column_fields["data"] = json.dumps(data)
+        if not column_fields:
+            return True
+        assignments = ", ".join(f"{k} = ?" for k in column_fields)
+        cursor = conn.execute(f"UPDATE {table} SET {assignments} WHERE {where}",
+                              [*column_fields.values(), *keys.values()])
+        return cursor.rowcount > 0
+
+    @timed("write")
+    def write_progress_many(self, user_id, skill_ref, step_fields, sub_fields=None, skill_fields=None):
+        with self._connect() as conn:
+            skill_name = self._resolve(conn, user_id, skill_ref)
+            if skill_name is None:
+                return False
+            for step_index, fields in step_fields.items():
+                fields = dict(fields)
+                mcqs = fields.pop("mcqs", None)
+                keys = {"user_id": user_id, "skill_name": skill_name, "step_index": step_index}
+                if not self._update_row(conn, "steps", self.STEP_COLUMNS, keys, fields):
+                    conn.rollback()
+                    return False
+                if mcqs is not None:
+                    conn.execute("INSERT OR REPLACE INTO mcqs VALUES (?, ?, ?, ?)",
+                                 (user_id, skill_name, step_index, json.dumps(mcqs)))
+            for (step_index, sub_index), fields in (sub_fields or {}).items():
+                self._update_row(conn, "sub_steps", self.SUB_STEP_COLUMNS,
+                                 {"user_id": user_id, "skill_name": skill_name,
+                                  "step_index": step_index, "sub_index": sub_index}, fields)
+            if skill_fields:
+                self._update_row(conn, "skills", self.SKILL_COLUMNS,
+                                 {"user_id": user_id, "skill_name": skill_name}, skill_fields)
+            conn.execute(
+                "UPDATE skills SET data = json_set(data, '$.version', COALESCE(json_extract(data, '$.version'), 0) + 1, "
+                "'$.updated_at', ?) WHERE user_id = ? AND skill_name = ?",
+                (int(time.time()), user_id, skill_name)
+            )
+            if any("mcqs" in fields for fields in step_fields.values()):
+                self._enforce_cap(conn, user_id)
+        return True
+
+    def _write_activity(self, conn, user_id, streaks, last_active):
+        conn.execute("DELETE FROM streaks WHERE user_id = ?", (user_id,))
+        conn.executemany("INSERT OR IGNORE INTO streaks VALUES (?, ?)", [(user_id, day) for day in streaks])
+        conn.execute("INSERT OR REPLACE INTO users VALUES (?, ?)", (user_id, last_active))
+
+    @timed("write")
+    def set_activity(self, user_id, streaks, last_active):
+        with self._connect() as conn:
+            self._write_activity(conn, user_id, streaks, last_active)
+
+    # Size cap and compaction
+
+    def _user_bytes(self, conn, user_id):
+        return sum(
+            conn.execute(f"SELECT COALESCE(SUM(LENGTH(data)), 0) FROM {table} WHERE user_id = ?", (user_id,)).fetchone()[0]
+            for table in ("skills", "steps", "sub_steps", "mcqs")
+        )
+
+    def _mcq_rows(self, conn, user_id, completed_only=False):
+        # Same order as compact_mcqs: completed steps first, then the oldest skills
+        return conn.execute(f"""
+            SELECT m.skill_name, m.step_index, LENGTH(m.data) AS size FROM mcqs m
+            JOIN skills k ON k.user_id = m.user_id AND k.skill_name = m.skill_name
+            LEFT JOIN steps s ON s.user_id = m.user_id AND s.skill_name = m.skill_name AND s.step_index = m.step_index
+            WHERE m.user_id = ? {"AND s.status = 'completed'" if completed_only else ""}
+            ORDER BY COALESCE(s.status = 'completed', 0) DESC, k.position, m.step_index
+        """, (user_id,)).fetchall()
+
+    def _enforce_cap(self, conn, user_id):
+        if not self.max_bytes:
+            return
+        size = self._user_bytes(conn, user_id)
+        for row in self._mcq_rows(conn, user_id):
+            if size <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM mcqs WHERE user_id = ? AND skill_name = ? AND step_index = ?",
+                         (user_id, row["skill_name"], row["step_index"]))
+            size -= row["size"]
+        if size > self.max_bytes:
+            raise UserDataTooLarge(f"Data for {user_id} would be {size} bytes; the limit is {self.max_bytes}")
+
+    @timed("write")
+    def compact(self, user_id):
+        with self._connect() as conn:
+            rows = self._mcq_rows(conn, user_id, completed_only=True)
+            conn.executemany("DELETE FROM mcqs WHERE user_id = ? AND skill_name = ? AND step_index = ?",
+                             [(user_id, row["skill_name"], row["step_index"]) for row in rows])
+        return len(rows)
+
+
+def migrate_json_to_sqlite(json_store, sqlite_store):
+    """Import every user document from a JSONUserStore into a SQLiteUserStore; returns the user ids"""
+    migrated = []
+    for user_id in json_store.user_ids():
+        sqlite_store.save(user_id, json_store.load(user_id))
+        migrated.append(user_id)
+    return migrated
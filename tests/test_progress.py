@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep the import-time user store away from the checked-in user_data/
+os.environ.setdefault("USER_DATA_DIR", tempfile.mkdtemp(prefix="test-user-data-"))
+os.environ["MCQ_PREGENERATE"] = "0"
+
+import app as learning_app
+from storage import JSONUserStore, SQLiteUserStore
+
+USER_ID = "0" * 32
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def client(request, tmp_path, monkeypatch):
+    if request.param == "json":
+        store = JSONUserStore(str(tmp_path / "json"))
+    else:
+        store = SQLiteUserStore(str(tmp_path / "user_data.db"))
+    monkeypatch.setattr(learning_app, "user_store", store)
+    monkeypatch.setattr(learning_app, "SHARED_USER_ID", USER_ID)
+    store.save_skill(USER_ID, {
+        "skill_name": "Counters",
+        "steps": [{"title": "One", "sub_steps": [{"title": "a"}, {"title": "b"}]}],
+    })
+    return learning_app.app.test_client()
+
+
+def post_batch(client, updates):
+    response = client.post("/update-progress/batch", json={"updates": updates})
+    assert response.status_code == 200
+    return response.get_json()["results"]
+
+
+def test_sub_step_then_step_update_in_one_batch_keeps_counts(client):
+    post_batch(client, [
+        {"skill_id": "counters", "step_index": 0, "substep_index": 0, "status": "completed"},
+        {"skill_id": "counters", "step_index": 0, "substep_index": None, "status": "completed"},
+    ])
+    step = learning_app.user_store.get_skill(USER_ID, "counters")["steps"][0]
+    assert step["sub_step_counts"] == {"completed": 1, "in_progress": 0}
+
+    results = post_batch(client, [
+        {"skill_id": "counters", "step_index": 0, "substep_index": 1, "status": "completed"},
+    ])
+    assert results[0]["step_progress"] == 100
+
+
+def test_malformed_items_fail_individually(client):
+    results = post_batch(client, [
+        1,
+        {"skill_id": ["x"], "step_index": 0, "status": "completed"},
+        {"skill_id": "counters", "step_index": 0, "status": ["completed"]},
+        {"skill_id": "counters", "step_index": 0, "substep_index": None, "status": "completed"},
+    ])
+    assert [("error" in result) for result in results] == [True, True, True, False]